@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+"""Solves a batch of .sudoku puzzles on a process pool and streams one result
+per puzzle, as each one finishes, to stdout or to a CSV/JSONL file.
+
+  python SudokuBatch.py input_puzzles/more --forward-checking --mrv
+  python SudokuBatch.py "input_puzzles/more/9x9/*.sudoku" -o results.csv
+  python SudokuBatch.py input_puzzles/more.zip --engine dlx
+  python SudokuBatch.py 9x9.sdkc --forward-checking
+"""
+import argparse, csv, glob, json, multiprocessing, os, sys, time, zipfile
+
+import SudokuStarterv2, SudokuCorpus
+
+FIELDS = ["puzzle", "size", "success", "stopped", "error", "time", "engine",
+    "forward_checking", "MRV", "MCV", "LCV", "timeout", "max_nodes",
+    "restarts", "seed"]
+
+#zip archives and corpora opened by this worker process, by path
+_archives = {}
+_corpora = {}
+
+def find_puzzles(paths):
+  """
+  return the puzzles named by paths, sorted. a directory is searched
+  recursively, anything else is expanded as a glob. a .zip archive gives
+  one (archive path, member name) pair per .sudoku member and a corpus
+  one (corpus path, index) pair per puzzle, the other puzzles are plain
+  file paths.
+  """
+  puzzles = []
+  for path in paths:
+    if os.path.isdir(path):
+      for root, dirs, files in os.walk(path):
+        for name in files:
+          if name.endswith(".sudoku"):
+            puzzles.append(os.path.join(root, name))
+      continue
+    for match in glob.glob(path):
+      if zipfile.is_zipfile(match):
+        puzzles.extend((match, name)
+            for name in SudokuStarterv2.zip_members(match))
+      elif SudokuCorpus.is_corpus(match):
+        with SudokuCorpus.Corpus(match) as corpus:
+          puzzles.extend((match, index) for index in xrange(len(corpus)))
+      else:
+        puzzles.append(match)
+  return sorted(puzzles)
+
+def puzzle_name(puzzle):
+  """
+  return the name of a puzzle from find_puzzles in the result records
+  """
+  if isinstance(puzzle, tuple) and isinstance(puzzle[1], (int, long)):
+    return "%s:%d" % puzzle
+  if isinstance(puzzle, tuple):
+    return os.path.join(*puzzle)
+  return puzzle
+
+def load_puzzle(puzzle):
+  """
+  return the name and the SudokuBoard of a puzzle from find_puzzles. zip
+  members are read straight from the archive, which stays open in the
+  worker for the next member, and so are corpus puzzles.
+  """
+  if isinstance(puzzle, tuple) and isinstance(puzzle[1], (int, long)):
+    path, index = puzzle
+    if path not in _corpora:
+      _corpora[path] = SudokuCorpus.Corpus(path)
+    return puzzle_name(puzzle), _corpora[path][index]
+  if isinstance(puzzle, tuple):
+    path, member = puzzle
+    if path not in _archives:
+      _archives[path] = zipfile.ZipFile(path)
+    with _archives[path].open(member) as f:
+      return puzzle_name(puzzle), SudokuStarterv2.init_board(f)
+  return puzzle, SudokuStarterv2.init_board(puzzle)
+
+def solve_puzzle(job):
+  """
+  solve one puzzle in a worker process. job is (puzzle, options), where
+  options holds the engine and heuristic flags passed on to solve().
+  returns the result record of the puzzle, with the error instead of a
+  result when the puzzle could not be read or solved.
+  """
+  puzzle, options = job
+  record = {"puzzle": puzzle_name(puzzle), "size": None, "success": False,
+      "stopped": None, "error": None, "time": None}
+  record.update(options)
+  try:
+    board = load_puzzle(puzzle)[1]
+    record["size"] = board.BoardSize
+    start = time.time()
+    result_board = SudokuStarterv2.solve(board, verbose=False, **options)
+    record["time"] = round(time.time() - start, 6)
+  except Exception as e:
+    #an exception here would stop the whole batch
+    record["error"] = "%s: %s" % (type(e).__name__, e)
+    return record
+
+  if isinstance(result_board, SudokuStarterv2.Unsolved):
+    record["stopped"] = result_board.reason
+  else:
+    record["success"] = SudokuStarterv2.is_complete(result_board)
+  return record
+
+class ResultWriter:
+  """Writes result records as CSV rows or JSON lines, flushing each one."""
+
+  def __init__(self, stream, format):
+    self.stream = stream
+    self.format = format
+    if format == "csv":
+      self.csv = csv.DictWriter(stream, FIELDS)
+      self.csv.writeheader()
+
+  def write(self, record):
+    if self.format == "csv":
+      self.csv.writerow(record)
+    else:
+      self.stream.write(json.dumps(record, sort_keys=True) + "\n")
+    self.stream.flush()
+
+def run_batch(puzzles, options, writer, workers=None):
+  """
+  solve every puzzle on a pool of workers processes (one per core by
+  default) and hand each record to writer as soon as it is ready.
+  returns the number of puzzles solved.
+  """
+  jobs = [(path, options) for path in puzzles]
+  pool = multiprocessing.Pool(workers or multiprocessing.cpu_count())
+  solved = 0
+  try:
+    for record in pool.imap_unordered(solve_puzzle, jobs):
+      writer.write(record)
+      if record["success"]:
+        solved += 1
+    pool.close()
+  except:
+    pool.terminate()
+    raise
+  finally:
+    pool.join()
+  return solved
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Solve .sudoku puzzles in "
+      "parallel and stream one result per puzzle.")
+  parser.add_argument("paths", nargs="+",
+      help="puzzle directories, files, zip archives or globs")
+  parser.add_argument("-o", "--output",
+      help="write results to this file instead of stdout")
+  parser.add_argument("--format", choices=["csv", "jsonl"],
+      help="result format, taken from the output extension by default")
+  parser.add_argument("-j", "--workers", type=int,
+      help="number of worker processes, one per core by default")
+  parser.add_argument("--engine", choices=["backtrack", "iterative", "dlx"],
+      default="backtrack")
+  parser.add_argument("--forward-checking", action="store_true")
+  parser.add_argument("--mrv", action="store_true")
+  parser.add_argument("--mcv", action="store_true")
+  parser.add_argument("--lcv", action="store_true")
+  parser.add_argument("--timeout", type=float,
+      help="seconds before a puzzle is given up")
+  parser.add_argument("--max-nodes", type=int,
+      help="search nodes before a puzzle is given up")
+  parser.add_argument("--restarts", action="store_true",
+      help="restart the search with random tie-breaks on a Luby schedule")
+  parser.add_argument("--seed", type=int,
+      help="seed of the random tie-breaks")
+  args = parser.parse_args(argv)
+
+  format = args.format
+  if format is None:
+    format = "csv" if args.output and args.output.endswith(".csv") else "jsonl"
+  options = {"engine": args.engine, "forward_checking": args.forward_checking,
+      "MRV": args.mrv, "MCV": args.mcv, "LCV": args.lcv,
+      "timeout": args.timeout, "max_nodes": args.max_nodes,
+      "restarts": args.restarts, "seed": args.seed}
+
+  puzzles = find_puzzles(args.paths)
+  stream = open(args.output, "w") if args.output else sys.stdout
+  try:
+    solved = run_batch(puzzles, options, ResultWriter(stream, format),
+        args.workers)
+  finally:
+    if args.output:
+      stream.close()
+  sys.stderr.write("solved %d of %d puzzles\n" % (solved, len(puzzles)))
+  return 0 if solved == len(puzzles) else 1
+
+if __name__ == "__main__":
+  sys.exit(main())
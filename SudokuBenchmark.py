@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+"""Benchmarks solve() on the bundled puzzles for every combination of the
+forward_checking, MRV, MCV and LCV flags and reports wall time, node counts
+and peak memory per board size as JSON.
+
+  python SudokuBenchmark.py -o baseline.json
+  python SudokuBenchmark.py --compare baseline.json
+"""
+import argparse, itertools, json, multiprocessing, os, resource, signal, sys
+import time
+
+import SudokuStarterv2
+
+FLAGS = ["forward_checking", "MRV", "MCV", "LCV"]
+PUZZLE_DIRS = [os.path.join("input_puzzles", "easy"),
+    os.path.join("input_puzzles", "more")]
+
+class Timeout(Exception):
+  pass
+
+def _alarm(signum, frame):
+  raise Timeout()
+
+def flag_combinations():
+  """
+  return the options of every combination of the heuristic flags
+  """
+  return [dict(zip(FLAGS, values))
+      for values in itertools.product([False, True], repeat=len(FLAGS))]
+
+def label(options):
+  """
+  return a short name for a flag combination, such as "forward_checking+MRV"
+  """
+  names = [flag for flag in FLAGS if options.get(flag)]
+  return "+".join(names) or "none"
+
+def percentile(values, p):
+  """
+  return the p-th percentile of values, interpolating between ranks
+  """
+  values = sorted(values)
+  if not values:
+    return None
+  k = (len(values) - 1) * p / 100.0
+  low = int(k)
+  high = min(low + 1, len(values) - 1)
+  return values[low] + (values[high] - values[low]) * (k - low)
+
+def run_case(case):
+  """
+  solve one puzzle once in a fresh worker process, so the peak resident
+  size belongs to this run only. case is (path, options, timeout).
+  """
+  path, options, timeout = case
+  board = SudokuStarterv2.init_board(path)
+
+  signal.signal(signal.SIGALRM, _alarm)
+  solved = False
+  timed_out = False
+  nodes = None
+  start = time.time()
+  try:
+    signal.alarm(timeout)
+    result_board, stats = SudokuStarterv2.solve(board, stats=True,
+        verbose=False, **options)
+    signal.alarm(0)
+    solved = stats.solved
+    nodes = stats.nodes
+  except Timeout:
+    timed_out = True
+  finally:
+    elapsed = time.time() - start
+
+  return {"size": board.BoardSize, "time": elapsed, "nodes": nodes,
+      "solved": solved, "timeout": timed_out,
+      "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+def find_puzzles(dirs, sizes=None, limit=None):
+  """
+  return the .sudoku files under dirs grouped by board size, keeping at
+  most limit puzzles of each size
+  """
+  by_size = {}
+  for top in dirs:
+    for root, subdirs, files in os.walk(top):
+      subdirs.sort()
+      for name in sorted(files):
+        if name.endswith(".sudoku"):
+          path = os.path.join(root, name)
+          with open(path) as f:
+            size = int(f.readline())
+          if sizes and size not in sizes:
+            continue
+          by_size.setdefault(size, []).append(path)
+  if limit:
+    for size in by_size:
+      by_size[size] = by_size[size][:limit]
+  return by_size
+
+def summarize(runs):
+  """
+  return the statistics of a list of run records
+  """
+  times = [run["time"] for run in runs if not run["timeout"]]
+  nodes = [run["nodes"] for run in runs if not run["timeout"]]
+  return {"runs": len(runs),
+      "solved": sum(1 for run in runs if run["solved"]),
+      "timeouts": sum(1 for run in runs if run["timeout"]),
+      "time_median": percentile(times, 50),
+      "time_p90": percentile(times, 90),
+      "time_p99": percentile(times, 99),
+      "nodes_median": percentile(nodes, 50),
+      "nodes_p90": percentile(nodes, 90),
+      "peak_rss_kb": max(run["peak_rss_kb"] for run in runs)}
+
+def run_benchmark(by_size, combinations, repeat, timeout, engine="backtrack"):
+  """
+  run every puzzle repeat times under every flag combination, one run at a
+  time, and return the summaries keyed by combination label and size
+  """
+  cases = []
+  for options in combinations:
+    options = dict(options, engine=engine)
+    for size in sorted(by_size):
+      for path in by_size[size]:
+        for i in range(repeat):
+          cases.append((path, options, timeout))
+
+  results = {}
+  pool = multiprocessing.Pool(1, maxtasksperchild=1)
+  try:
+    runs = pool.map(run_case, cases, chunksize=1)
+  finally:
+    pool.close()
+    pool.join()
+  grouped = {}
+  for (path, options, limit), run in zip(cases, runs):
+    grouped.setdefault((label(options), run["size"]), []).append(run)
+  for (name, size), group in grouped.items():
+    results.setdefault(name, {})[str(size)] = summarize(group)
+  return results
+
+def compare(results, baseline, threshold):
+  """
+  return a message for every combination and size that got slower than
+  the baseline by more than threshold, or solved fewer puzzles
+  """
+  regressions = []
+  for name in sorted(results):
+    for size in sorted(results[name], key=int):
+      new = results[name][size]
+      old = baseline.get(name, {}).get(size)
+      if old is None:
+        continue
+      if new["solved"] < old["solved"]:
+        regressions.append("%s %sx%s: solved %d, baseline %d"
+            % (name, size, size, new["solved"], old["solved"]))
+      if (new["time_median"] is not None and old["time_median"]
+          and new["time_median"] > old["time_median"] * (1 + threshold)):
+        regressions.append("%s %sx%s: median %.4fs, baseline %.4fs"
+            % (name, size, size, new["time_median"], old["time_median"]))
+  return regressions
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Benchmark solve() across "
+      "board sizes and heuristic combinations.")
+  parser.add_argument("dirs", nargs="*", default=PUZZLE_DIRS,
+      help="puzzle directories, the bundled sets by default")
+  parser.add_argument("-o", "--output", help="write the JSON report here")
+  parser.add_argument("--compare", metavar="BASELINE",
+      help="flag regressions against a saved JSON report")
+  parser.add_argument("--threshold", type=float, default=0.10,
+      help="allowed slowdown of the median before it is a regression")
+  parser.add_argument("-r", "--repeat", type=int, default=3)
+  parser.add_argument("-t", "--timeout", type=int, default=10,
+      help="seconds before a run is abandoned")
+  parser.add_argument("--sizes", type=int, nargs="+",
+      help="only these board sizes")
+  parser.add_argument("--limit", type=int,
+      help="at most this many puzzles of each size")
+  parser.add_argument("--engine", choices=["backtrack", "iterative", "dlx"],
+      default="backtrack")
+  args = parser.parse_args(argv)
+
+  by_size = find_puzzles(args.dirs, args.sizes, args.limit)
+  combinations = flag_combinations()
+  if args.engine == "dlx":
+    #the exact cover engine ignores the heuristic flags
+    combinations = combinations[:1]
+  results = run_benchmark(by_size, combinations, args.repeat, args.timeout,
+      args.engine)
+  report = json.dumps(results, indent=2, sort_keys=True)
+  if args.output:
+    with open(args.output, "w") as f:
+      f.write(report + "\n")
+  else:
+    print report
+
+  if args.compare:
+    with open(args.compare) as f:
+      baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    for message in regressions:
+      sys.stderr.write("REGRESSION %s\n" % message)
+    if regressions:
+      return 1
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
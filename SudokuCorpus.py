@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+"""A compact binary corpus of puzzles of one board size, read through mmap.
+
+The file is a 16 byte header followed by one fixed-size record per puzzle:
+
+  magic "SDKC", version (1 byte), bits per cell (1 byte, 4, 8 or 16),
+  board size (2 bytes), puzzle count (8 bytes), all little-endian
+
+A record holds the cells row by row, 0 for an empty cell. With 4 bits per
+cell (boards up to 15x15) the first cell of each byte is in the high
+nibble and an odd last cell is padded with 0.
+
+  python SudokuCorpus.py input_puzzles/more/9x9 -o 9x9.sdkc
+  python SudokuCorpus.py input_puzzles/more.zip --size 16 -o 16x16.sdkc
+"""
+import argparse, mmap, os, struct, sys
+from array import array
+
+import SudokuStarterv2
+
+MAGIC = "SDKC"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHQ")
+
+#the high and the low nibble of every byte, for str.translate
+HIGH_NIBBLES = "".join(chr(byte >> 4) for byte in range(256))
+LOW_NIBBLES = "".join(chr(byte & 15) for byte in range(256))
+
+def cell_bits(size):
+  """
+  return the bits per cell used for boards of the given size
+  """
+  if size <= 15:
+    return 4
+  if size <= 255:
+    return 8
+  return 16
+
+def record_size(size, bits):
+  """
+  return the bytes in one record
+  """
+  return (size * size * bits + 7) // 8
+
+def encode(board, bits):
+  """
+  return the record of a board
+  """
+  grid = board.Grid
+  if bits == 4:
+    values = grid.tolist()
+    if len(values) % 2:
+      values.append(0)
+    return array("B", [values[i] << 4 | values[i + 1]
+        for i in range(0, len(values), 2)]).tostring()
+  values = array("B" if bits == 8 else "H", grid)
+  if bits == 16 and sys.byteorder == "big":
+    values.byteswap()
+  return values.tostring()
+
+def decode(record, size, bits):
+  """
+  return the flat grid stored in a record
+  """
+  if bits == 4:
+    grid = array("B", [0]) * (2 * len(record))
+    grid[0::2] = array("B", record.translate(HIGH_NIBBLES))
+    grid[1::2] = array("B", record.translate(LOW_NIBBLES))
+    del grid[size * size:]
+    return grid
+  grid = array("B" if bits == 8 else "H", record)
+  if bits == 16 and sys.byteorder == "big":
+    grid.byteswap()
+  return grid
+
+def write_corpus(path, boards):
+  """
+  write boards, all of the same size, to a corpus file. boards may be any
+  iterable, it is read once. returns the number of puzzles written.
+  """
+  count = 0
+  size = None
+  try:
+    with open(path, "wb") as f:
+      f.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0))
+      for board in boards:
+        if size is None:
+          size = board.BoardSize
+          bits = cell_bits(size)
+        elif board.BoardSize != size:
+          raise ValueError("a corpus holds one board size, got %d and %d"
+              % (size, board.BoardSize))
+        f.write(encode(board, bits))
+        count += 1
+      if size is not None:
+        #the header is only complete once the count is known
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, bits, size, count))
+  except:
+    os.remove(path)
+    raise
+  return count
+
+class Corpus:
+  """A corpus file opened for reading. The file is memory-mapped and
+  corpus[i] decodes only the i-th record into a SudokuBoard, so corpora far
+  bigger than memory can be read at random."""
+
+  def __init__(self, path):
+    self.path = path
+    self.file = open(path, "rb")
+    header = self.file.read(HEADER.size)
+    if len(header) < HEADER.size:
+      raise ValueError("%s: not a puzzle corpus" % path)
+    magic, version, self.bits, self.size, self.count = HEADER.unpack(header)
+    if magic != MAGIC:
+      raise ValueError("%s: not a puzzle corpus" % path)
+    if version != VERSION:
+      raise ValueError("%s: unsupported corpus version %d" % (path, version))
+    self.record = record_size(self.size, self.bits)
+    self.map = None
+    if self.count:
+      self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+      if len(self.map) < HEADER.size + self.count * self.record:
+        raise ValueError("%s: truncated corpus" % path)
+
+  def __len__(self):
+    return self.count
+
+  def __getitem__(self, index):
+    if index < 0:
+      index += self.count
+    if not 0 <= index < self.count:
+      raise IndexError("corpus index out of range")
+    start = HEADER.size + index * self.record
+    grid = decode(self.map[start:start + self.record], self.size, self.bits)
+    return SudokuStarterv2.SudokuBoard(self.size, grid)
+
+  def __iter__(self):
+    for index in xrange(self.count):
+      yield self[index]
+
+  def close(self):
+    if self.map is not None:
+      self.map.close()
+    self.file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+def is_corpus(path):
+  """
+  return True if path is a corpus file
+  """
+  try:
+    with open(path, "rb") as f:
+      return f.read(len(MAGIC)) == MAGIC
+  except IOError:
+    return False
+
+def main(argv=None):
+  import SudokuBatch
+
+  parser = argparse.ArgumentParser(description="Convert .sudoku puzzles to "
+      "a binary corpus.")
+  parser.add_argument("paths", nargs="+",
+      help="puzzle directories, files, zip archives or globs")
+  parser.add_argument("-o", "--output", required=True,
+      help="the corpus file to write")
+  parser.add_argument("--size", type=int,
+      help="only puzzles of this size, needed when the inputs mix sizes")
+  args = parser.parse_args(argv)
+
+  def boards():
+    for puzzle in SudokuBatch.find_puzzles(args.paths):
+      path, board = SudokuBatch.load_puzzle(puzzle)
+      if args.size is None or board.BoardSize == args.size:
+        yield board
+
+  try:
+    count = write_corpus(args.output, boards())
+  except ValueError as e:
+    sys.stderr.write("%s, choose one with --size\n" % e)
+    return 1
+  sys.stderr.write("wrote %d puzzles to %s\n" % (count, args.output))
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+"""Generates puzzles with exactly one solution. A random solved board is
+made first, then its cells are emptied in random order as long as the
+puzzle keeps a unique solution, down to a target number of clues:
+
+  python SudokuGenerator.py 9 -n 1000 --clues 24 --seed 1 -o puzzles
+  python SudokuGenerator.py 25 -n 4 | python SudokuStream.py --engine dlx
+
+With -o every puzzle is written to its own .sudoku file, named like the
+bundled ones, otherwise one puzzle per line goes to stdout. The same seed
+gives the same puzzles whatever the number of workers.
+
+The uniqueness checks get much slower close to the fewest clues a board
+can keep, so on 16x16 and 25x25 a --clues target near the bundled
+puzzles (about 110 and 320) keeps generation to seconds per puzzle:
+
+  python SudokuGenerator.py 25 -n 20 --clues 320 -o puzzles
+"""
+import argparse, itertools, math, multiprocessing, os, random, sys, time
+
+import SudokuStarterv2
+
+def shuffled_lines(rng, subsquare):
+  """
+  return a random order of the rows (or cols) of a board that keeps every
+  band together: the bands are shuffled and so are the rows inside each
+  """
+  bands = range(subsquare)
+  rng.shuffle(bands)
+  lines = []
+  for band in bands:
+    inner = range(subsquare)
+    rng.shuffle(inner)
+    lines.extend(band * subsquare + row for row in inner)
+  return lines
+
+def random_grid(size, rng):
+  """
+  return a random solved SudokuBoard. the squares on the diagonal share no
+  unit, so each gets a random permutation of the values, and Dancing
+  Links solves the rest; a fill it cannot complete, which happens on 4x4
+  boards, is drawn again. the solution is then relabelled, its rows, cols,
+  bands and stacks shuffled and maybe transposed, all at random.
+  """
+  subsquare = int(round(math.sqrt(size)))
+  while True:
+    rows = [[0] * size for i in range(size)]
+    for square in range(subsquare):
+      values = range(1, size + 1)
+      rng.shuffle(values)
+      for i, value in enumerate(values):
+        rows[square * subsquare + i // subsquare][
+            square * subsquare + i % subsquare] = value
+    solution = SudokuStarterv2.solve(SudokuStarterv2.SudokuBoard(size, rows),
+        engine="dlx", verbose=False)
+    if SudokuStarterv2.is_complete(solution):
+      break
+  digits = [0] + rng.sample(range(1, size + 1), size)
+  transform = (rng.random() < 0.5, shuffled_lines(rng, subsquare),
+      shuffled_lines(rng, subsquare), digits)
+  return SudokuStarterv2.SudokuBoard(size,
+      SudokuStarterv2.fromCanonical(solution.Grid, size, transform))
+
+def is_unique(board):
+  """
+  return True if the board has exactly one solution. Dancing Links counts
+  quickest up to 16x16, on bigger boards the propagation of forward
+  checking cuts the search down more than it costs.
+  """
+  if board.BoardSize <= 16:
+    options = {"engine": "dlx"}
+  else:
+    options = {"forward_checking": True, "MRV": True, "MCV": True}
+  return SudokuStarterv2.solve(board, count_solutions=2, verbose=False,
+      **options) == 1
+
+def remove_clues(solution, rng, clues=0):
+  """
+  return a puzzle with the unique solution given, made by emptying its
+  cells in random order and putting back every cell whose removal lets a
+  second solution in, until only clues cells are left or none can go.
+  cells are emptied in runs checked at once, which double after a unique
+  run and halve after one that is not, so the easy early removals only
+  take a few checks.
+  """
+  size = solution.BoardSize
+  grid = solution.Grid[:]
+  cells = range(size * size)
+  rng.shuffle(cells)
+  given = len(cells)
+  run = 1
+  i = 0
+  while i < len(cells) and given > clues:
+    chunk = cells[i:i + min(run, given - clues)]
+    for cell in chunk:
+      grid[cell] = 0
+    if is_unique(SudokuStarterv2.SudokuBoard(size, grid)):
+      i += len(chunk)
+      given -= len(chunk)
+      run *= 2
+    else:
+      for cell in chunk:
+        grid[cell] = solution.Grid[cell]
+      if len(chunk) == 1:
+        #the cell is needed, and stays needed as more cells go
+        i += 1
+      run = max(1, len(chunk) // 2)
+  return SudokuStarterv2.SudokuBoard(size, grid)
+
+def generate_puzzle(size, clues=0, seed=None, attempts=1):
+  """
+  return a puzzle of the given size with a unique solution and as close to
+  clues given cells as it gets. a puzzle left with more clues comes from a
+  solved board none of whose remaining cells can go, so up to attempts
+  boards are tried and the puzzle with the fewest clues is kept.
+  """
+  rng = random.Random(seed)
+  best = None
+  best_given = None
+  for attempt in range(attempts):
+    puzzle = remove_clues(random_grid(size, rng), rng, clues)
+    given = sum(1 for value in puzzle.Grid if value != 0)
+    if best is None or given < best_given:
+      best, best_given = puzzle, given
+    if given <= clues:
+      break
+  return best
+
+def generate_job(job):
+  """
+  generate_puzzle in a worker process. job is (size, clues, seed,
+  attempts), returns the flat grid of the puzzle.
+  """
+  return generate_puzzle(*job).Grid
+
+def generate_puzzles(count, size, clues=0, seed=None, attempts=1, workers=1,
+    chunk=256):
+  """
+  yield count puzzles from generate_puzzle, in order. every puzzle gets its
+  own seed drawn from seed, so the puzzles do not depend on workers. with
+  more than one worker they are generated on a pool, chunk at a time.
+  """
+  master = random.Random(seed)
+  jobs = ((size, clues, master.getrandbits(64), attempts)
+      for i in xrange(count))
+  if workers <= 1:
+    for job in jobs:
+      yield SudokuStarterv2.SudokuBoard(size, generate_job(job))
+    return
+  pool = multiprocessing.Pool(workers)
+  try:
+    while True:
+      block = list(itertools.islice(jobs, chunk))
+      if not block:
+        break
+      for grid in pool.imap(generate_job, block):
+        yield SudokuStarterv2.SudokuBoard(size, grid)
+    pool.close()
+  except:
+    pool.terminate()
+    raise
+  finally:
+    pool.join()
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Generate puzzles with a "
+      "unique solution.")
+  parser.add_argument("size", type=int,
+      help="board size, a square such as 9, 16 or 25")
+  parser.add_argument("-n", "--count", type=int, default=1,
+      help="number of puzzles")
+  parser.add_argument("--clues", type=int, default=0,
+      help="stop emptying cells at this many clues, as few as possible "
+      "by default")
+  parser.add_argument("--seed", type=int,
+      help="seed of the random choices, for the same puzzles every run")
+  parser.add_argument("--attempts", type=int, default=1,
+      help="solved boards to try for a puzzle that stays above --clues")
+  parser.add_argument("-j", "--workers", type=int,
+      help="number of worker processes, one per core by default")
+  parser.add_argument("-o", "--output",
+      help="write .sudoku files to this directory instead of lines to stdout")
+  args = parser.parse_args(argv)
+
+  subsquare = int(round(math.sqrt(args.size)))
+  if args.size < 1 or subsquare ** 2 != args.size:
+    parser.error("the size must be a square")
+  if args.output and not os.path.isdir(args.output):
+    os.makedirs(args.output)
+
+  start = time.time()
+  given = []
+  for number, puzzle in enumerate(generate_puzzles(args.count, args.size,
+      args.clues, args.seed, args.attempts,
+      args.workers or multiprocessing.cpu_count()), 1):
+    given.append(sum(1 for value in puzzle.Grid if value != 0))
+    if args.output:
+      name = "%dx%d.%d.sudoku" % (args.size, args.size, number)
+      with open(os.path.join(args.output, name), "w") as f:
+        f.write(SudokuStarterv2.format_file(puzzle))
+    else:
+      sys.stdout.write(SudokuStarterv2.format_line(puzzle) + "\n")
+  elapsed = time.time() - start
+  if given:
+    sys.stderr.write("generated %d puzzles with %d to %d clues, %.1f on "
+        "average, in %.2fs (%.0f per minute)\n" % (len(given), min(given),
+        max(given), float(sum(given)) / len(given), elapsed,
+        60 * len(given) / elapsed))
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+"""Serves solve() over HTTP, so callers pay the interpreter and import
+start-up once instead of once per puzzle. POST a puzzle, in the .sudoku
+format or on one line (see SudokuStarterv2.parse_line), to /solve; the
+options of solve() and a timeout in seconds go in the query string:
+
+  python SudokuServer.py --port 8000 -j 4
+  curl --data-binary @input_puzzles/easy/9_9.sudoku \\
+      "localhost:8000/solve?forward_checking=1&MRV=1&timeout=2"
+
+The answer is a JSON object with the solution on one line, whether it is
+solved, and the seconds spent queued and solving. Every client gets its
+own thread. Requests wait on a bounded queue and are handed to a process
+pool in batches, and only a few batches per worker are in flight at once.
+When the queue is full the server answers 503 straight away. A request
+that runs out of time is stopped in its worker and answered with 504, and
+one stopped by its max_nodes with 409. A puzzle that has no solution is
+answered with 422.
+"""
+import argparse, BaseHTTPServer, json, math, multiprocessing, Queue, signal
+import SocketServer, sys, threading, time, urlparse
+
+import SudokuStarterv2
+
+FLAGS = ["forward_checking", "MRV", "MCV", "LCV", "backjump", "restarts"]
+
+def read_puzzle(text):
+  """
+  return the SudokuBoard of a request body in the .sudoku format or on one
+  line. raises ValueError when it is neither, or when the size is not a
+  square or a value is out of range.
+  """
+  lines = text.strip().splitlines()
+  if not lines:
+    raise ValueError("empty puzzle")
+  try:
+    if len(lines) > 1:
+      rows = SudokuStarterv2.parse_file(text.strip() + "\n")
+    else:
+      rows = SudokuStarterv2.parse_line(lines[0])
+  except (ValueError, IndexError) as e:
+    raise ValueError("bad puzzle: %s" % e)
+  size = len(rows)
+  subsquare = int(round(math.sqrt(size)))
+  if size == 0 or subsquare ** 2 != size:
+    raise ValueError("bad puzzle: the size must be a square, got %d" % size)
+  for row in rows:
+    for value in row:
+      if not 0 <= value <= size:
+        raise ValueError("bad puzzle: value %d is out of range" % value)
+  return SudokuStarterv2.SudokuBoard(size, rows)
+
+def read_options(query, default_timeout):
+  """
+  return the solve() options and the timeout of a parsed query string.
+  raises ValueError for a bad value.
+  """
+  options = {}
+  for name in FLAGS:
+    if name in query:
+      options[name] = query[name][-1].lower() in ("1", "true", "yes", "on")
+  if "engine" in query:
+    options["engine"] = query["engine"][-1]
+    if options["engine"] not in ("backtrack", "iterative", "dlx"):
+      raise ValueError("unknown engine: %s" % options["engine"])
+  if "max_nodes" in query:
+    options["max_nodes"] = int(query["max_nodes"][-1])
+  if "seed" in query:
+    options["seed"] = int(query["seed"][-1])
+  timeout = default_timeout
+  if "timeout" in query:
+    timeout = float(query["timeout"][-1])
+    if timeout <= 0:
+      raise ValueError("timeout must be positive")
+  return options, timeout
+
+def solve_batch(jobs):
+  """
+  solve a batch of requests in a worker process, one after the other.
+  every job is (size, grid, options, deadline); a request whose deadline
+  has passed is not started. returns one result dict per job, with the
+  solution only when the puzzle is solved.
+  """
+  results = []
+  for size, grid, options, deadline in jobs:
+    start = time.time()
+    result = {"started": start}
+    try:
+      timeout = deadline - start
+      if timeout <= 0:
+        result.update(solved=False, stopped="timeout", time=0.0)
+      else:
+        board = SudokuStarterv2.SudokuBoard(size, grid)
+        solution = SudokuStarterv2.solve(board, timeout=timeout,
+            verbose=False, **options)
+        result["time"] = time.time() - start
+        if isinstance(solution, SudokuStarterv2.Unsolved):
+          result.update(solved=False, stopped=solution.reason)
+        elif SudokuStarterv2.is_complete(solution):
+          result.update(solved=True,
+              solution=SudokuStarterv2.format_line(solution))
+        else:
+          result.update(solved=False, unsolvable=True)
+    except Exception as e:
+      #an exception here would leave the batch unanswered
+      result.update(solved=False, error="%s: %s" % (type(e).__name__, e))
+    results.append(result)
+  return results
+
+class Request:
+  """A puzzle waiting for its result. job is what solve_batch gets."""
+
+  def __init__(self, job):
+    self.job = job
+    self.arrived = time.time()
+    self.done = threading.Event()
+    self.result = None
+
+class Dispatcher(threading.Thread):
+  """Takes requests off the queue and sends them to the pool in batches
+  of up to batch_size, waiting at most batch_wait seconds to fill one.
+  At most max_batches batches are in the pool at a time, so a slow pool
+  backs up into the queue."""
+
+  def __init__(self, pool, requests, batch_size, batch_wait, max_batches):
+    threading.Thread.__init__(self)
+    self.daemon = True
+    self.pool = pool
+    self.requests = requests
+    self.batch_size = batch_size
+    self.batch_wait = batch_wait
+    self.slots = threading.BoundedSemaphore(max_batches)
+
+  def run(self):
+    while True:
+      self.slots.acquire()
+      batch = [self.requests.get()]
+      end = time.time() + self.batch_wait
+      while len(batch) < self.batch_size:
+        remaining = end - time.time()
+        if remaining <= 0:
+          break
+        try:
+          batch.append(self.requests.get(timeout=remaining))
+        except Queue.Empty:
+          break
+      self.pool.apply_async(solve_batch, ([request.job for request in batch],),
+          callback=lambda results, batch=batch: self.finish(batch, results))
+
+  def finish(self, batch, results):
+    for request, result in zip(batch, results):
+      request.result = result
+      request.done.set()
+    self.slots.release()
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+  """POST /solve solves a puzzle, GET /status reports the queue."""
+
+  def reply(self, code, body):
+    data = json.dumps(body, sort_keys=True) + "\n"
+    self.send_response(code)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(data)))
+    self.end_headers()
+    self.wfile.write(data)
+
+  def do_GET(self):
+    if urlparse.urlparse(self.path).path != "/status":
+      return self.reply(404, {"error": "not found"})
+    self.reply(200, {"queued": self.server.requests.qsize(),
+        "workers": self.server.workers})
+
+  def do_POST(self):
+    url = urlparse.urlparse(self.path)
+    if url.path != "/solve":
+      return self.reply(404, {"error": "not found"})
+    text = self.rfile.read(int(self.headers.getheader("content-length") or 0))
+    try:
+      options, timeout = read_options(urlparse.parse_qs(url.query),
+          self.server.request_timeout)
+      board = read_puzzle(text)
+    except ValueError as e:
+      return self.reply(400, {"error": str(e)})
+
+    request = Request((board.BoardSize, board.Grid, options,
+        time.time() + timeout))
+    try:
+      self.server.requests.put_nowait(request)
+    except Queue.Full:
+      return self.reply(503, {"error": "too many requests queued"})
+    #the worker stops the search at the deadline, the extra second covers
+    #a worker that is stuck inside a single node
+    if not request.done.wait(timeout + 1.0):
+      return self.reply(504, {"solved": False, "stopped": "timeout",
+          "total": time.time() - request.arrived})
+
+    result = dict(request.result)
+    result["queued"] = result.pop("started") - request.arrived
+    result["total"] = time.time() - request.arrived
+    if "error" in result:
+      return self.reply(500, result)
+    if result.get("unsolvable"):
+      return self.reply(422, result)
+    if result.get("stopped") == "timeout":
+      return self.reply(504, result)
+    if result.get("stopped") is not None:
+      return self.reply(409, result)
+    self.reply(200, result)
+
+  def log_message(self, format, *args):
+    if self.server.verbose:
+      BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+class SolveServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+  """An HTTP server answering every client on its own thread, with the
+  pool, the request queue and the dispatcher behind it."""
+  daemon_threads = True
+  allow_reuse_address = True
+
+  def __init__(self, address, workers=None, queue_size=256, batch_size=8,
+      batch_wait=0.005, timeout=10.0, verbose=False):
+    self.workers = workers or multiprocessing.cpu_count()
+    #the pool is forked before the socket is opened, so the workers do
+    #not hold on to it
+    self.pool = multiprocessing.Pool(self.workers)
+    BaseHTTPServer.HTTPServer.__init__(self, address, Handler)
+    self.request_timeout = timeout
+    self.verbose = verbose
+    self.requests = Queue.Queue(queue_size)
+    self.dispatcher = Dispatcher(self.pool, self.requests, batch_size,
+        batch_wait, 2 * self.workers)
+    self.dispatcher.start()
+
+  def server_close(self):
+    BaseHTTPServer.HTTPServer.server_close(self)
+    self.pool.terminate()
+    self.pool.join()
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Serve solve() over HTTP.")
+  parser.add_argument("--host", default="127.0.0.1")
+  parser.add_argument("--port", type=int, default=8000)
+  parser.add_argument("-j", "--workers", type=int,
+      help="number of worker processes, one per core by default")
+  parser.add_argument("--queue", type=int, default=256,
+      help="requests waiting before new ones are refused")
+  parser.add_argument("--batch", type=int, default=8,
+      help="most requests sent to a worker at once")
+  parser.add_argument("--batch-wait", type=float, default=0.005,
+      help="seconds to wait for a batch to fill")
+  parser.add_argument("-t", "--timeout", type=float, default=10.0,
+      help="seconds a request may take unless it asks for its own")
+  parser.add_argument("-v", "--verbose", action="store_true",
+      help="log every request")
+  args = parser.parse_args(argv)
+
+  server = SolveServer((args.host, args.port), args.workers, args.queue,
+      args.batch, args.batch_wait, args.timeout, args.verbose)
+  sys.stderr.write("serving on %s:%d with %d workers\n"
+      % (args.host, args.port, server.workers))
+  #stop as cleanly on a kill as on ^C
+  signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.server_close()
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -1,68 +1,544 @@
 #!/usr/bin/env python
 import struct, string, math, copy
-import time
-
-class SudokuBoard:
+import time, io, os, zipfile, multiprocessing, itertools, json, collections
+import random
+from array import array
+try:
+    import numpy
+except ImportError:
+    #the batch functions check one board at a time instead
+    numpy = None
+
+#kinds of undo log entries
+TRAIL_VALUE = 0
+TRAIL_DOMAIN = 1
+TRAIL_REASON = 2
+
+#largest nogood kept by solve(backjump=True), in decisions
+NOGOOD_SIZE = 4
+
+#nodes of the shortest run of solve(restarts=True), the runs are this
+#times the Luby sequence
+RESTART_NODES = 100
+
+#index tables of every board size seen so far
+_geometries = {}
+
+def geometry(size):
+    """Returns the Geometry of the given board size, building it the first
+    time the size is seen."""
+    if size not in _geometries:
+        _geometries[size] = Geometry(size)
+    return _geometries[size]
+
+class Geometry(object):
+    """Index tables of one board size, shared by every board of that size.
+    Cells are numbered row * size + col in the flat grid, so the cell
+    (row, col) sits at Index[row] + col. Units[cell] holds the row, col and
+    square unit of a cell (numbered as in SudokuBoard.recount),
+    UnitCells[unit] the cells of a unit and Peers[cell] the other cells
+    sharing a unit with a cell, each once. Cells in the last two are
+    (index, row, col) tuples."""
+    __slots__ = ('Size', 'SquareSize', 'Index', 'Units', 'UnitCells', 'Peers')
+
+    def __init__(self, size):
+        subsquare = int(math.sqrt(size))
+        self.Size = size
+        self.SquareSize = subsquare
+        self.Index = tuple(row * size for row in range(size))
+        cells = [(row * size + col, row, col)
+            for row in range(size) for col in range(size)]
+        self.Units = tuple((row, size + col,
+            2 * size + (row // subsquare) * subsquare + col // subsquare)
+            for index, row, col in cells)
+        members = [[] for i in range(3 * size)]
+        for cell in cells:
+            for unit in self.Units[cell[0]]:
+                members[unit].append(cell)
+        self.UnitCells = tuple(tuple(unit) for unit in members)
+        peers = []
+        for index, row, col in cells:
+            seen = set()
+            for unit in self.Units[index]:
+                seen.update(self.UnitCells[unit])
+            seen.discard(cells[index])
+            peers.append(tuple(sorted(seen)))
+        self.Peers = tuple(peers)
+
+    def __deepcopy__(self, memo):
+        #the tables never change, copies of a board share them
+        return self
+
+    def __reduce__(self):
+        return geometry, (self.Size,)
+
+def makeGrid(size, board):
+    """Returns the flat grid of a board given as a list of rows. A flat
+    array is used as it is. Values are stored in bytes, or in 16 bits for
+    boards bigger than 255."""
+    if isinstance(board, array):
+        return board
+    return array('B' if size <= 255 else 'H',
+        [value for row in board for value in row])
+
+class SudokuBoard(object):
     """This will be the sudoku board game object your player will manipulate."""
+    __slots__ = ('BoardSize', 'Grid', 'Geometry', 'Index',
+        'ForwardingCheckingBoard', 'Trail', 'Order', 'Pending', 'Stats',
+        'UnitCounts', 'EmptyCells', 'Conflicts', 'CandidateCounts',
+        'Reasons', 'Failure', 'Budget', 'Random')
   
-    def __init__(self, size, board, forward_checking_board=[]):
+    def __init__(self, size, board, forward_checking_board=[], trail=None):
       """the constructor for the SudokuBoard"""
       self.BoardSize = size #the size of the board
-      self.CurrentGameBoard= board #the current state of the game board
+      #the current state of the game board, one flat array of size*size
+      self.Grid = makeGrid(size, board)
+      #index tables of the board size
+      self.Geometry = geometry(size)
+      self.Index = self.Geometry.Index
       self.ForwardingCheckingBoard = forward_checking_board
-  
+      #undo log of (kind, row, col, old) entries, None when not in trail mode
+      self.Trail = trail
+      #MRV buckets of the empty cells, None when not in use
+      self.Order = None
+      #units waiting for checkingBoard, None without forward checking
+      self.Pending = None
+      #SearchStats of the running search, None when stats are off
+      self.Stats = None
+      #per cell, the bitmask of the decision levels its domain (or value)
+      #depends on, None when not backjumping
+      self.Reasons = None
+      #decision levels of the last propagation failure
+      self.Failure = 0
+      #SearchBudget of the running search, None when it has no limits
+      self.Budget = None
+      #random.Random breaking the ties of the heuristics, None to break
+      #them in a fixed order
+      self.Random = None
+      self.recount()
+
+    @property
+    def CurrentGameBoard(self):
+        """The game board as rows indexed [row][col]. The rows are views of
+        the flat grid, so writing through them changes the board without
+        updating the counters."""
+        return [GridRow(self.Grid, start, self.BoardSize)
+            for start in self.Index]
+
+    def recount(self):
+        """Rebuilds the per-unit value counts, the empty-cell counter and the
+        conflict counter from the grid. Units 0..N-1 are the rows,
+        N..2N-1 the cols and 2N..3N-1 the squares; index 0 of a unit's
+        counts is the number of filled cells in it.
+        When the board has a domain store, CandidateCounts[unit][v] is the
+        number of empty cells in the unit that still have v as a candidate."""
+        size = self.BoardSize
+        self.UnitCounts = [[0] * (size + 1) for i in range(3 * size)]
+        self.EmptyCells = size * size
+        #number of (unit, value) pairs where the value appears more than once
+        self.Conflicts = 0
+        self.CandidateCounts = None
+        grid = self.Grid
+        for row in range(size):
+            for col in range(size):
+                if grid[row * size + col] != 0:
+                    self._count(row, col, grid[row * size + col], 1)
+        if self.ForwardingCheckingBoard:
+            self.CandidateCounts = [[0] * (size + 1) for i in range(3 * size)]
+            for row in range(size):
+                for col in range(size):
+                    if grid[row * size + col] == 0:
+                        self._candidates(row, col,
+                            self.ForwardingCheckingBoard[row][col], 1)
+
+    def units(self, row, col):
+        """Returns the indices of the row, col and square units of a cell."""
+        return self.Geometry.Units[self.Index[row] + col]
+
+    def _candidates(self, row, col, domain, step):
+        """Adds step to the candidate counts of every value in domain in the
+        units of (row, col)."""
+        values = maskValues(domain)
+        for unit in self.units(row, col):
+            counts = self.CandidateCounts[unit]
+            for value in values:
+                counts[value] += step
+
+    def _count(self, row, col, value, step):
+        """Adds step to the counts of value in the units of (row, col)."""
+        for unit in self.units(row, col):
+            counts = self.UnitCounts[unit]
+            if step > 0 and counts[value] == 1:
+                self.Conflicts += 1
+            elif step < 0 and counts[value] == 2:
+                self.Conflicts -= 1
+            counts[value] += step
+            counts[0] += step
+        self.EmptyCells -= step
+
+    def _place(self, row, col, value):
+        """Writes value into the cell and keeps the counters up to date."""
+        index = self.Index[row] + col
+        old = self.Grid[index]
+        if old != 0:
+            self._count(row, col, old, -1)
+        self.Grid[index] = value
+        if value != 0:
+            self._count(row, col, value, 1)
+        if self.CandidateCounts is not None and (old == 0) != (value == 0):
+            #the cell's candidates only count while it is empty
+            self._candidates(row, col, self.ForwardingCheckingBoard[row][col],
+                1 if value == 0 else -1)
+        if self.Order is not None:
+            if value != 0:
+                self.Order.remove(row, col)
+            elif old != 0:
+                self.Order.add(row, col, self.ForwardingCheckingBoard[row][col])
 
     def set_value(self, row, col, value):
-        """This function will create a new sudoku board object with the input
-        value placed on the GameBoard row and col are both zero-indexed"""
+        """This function will place the input value on the GameBoard and
+        return the board. row and col are both zero-indexed"""
 
+        #record the old value so the assignment can be undone
+        if self.Trail is not None:
+            self.Trail.append((TRAIL_VALUE, row, col,
+                self.Grid[self.Index[row] + col]))
         #add the value to the appropriate position on the board
-        self.CurrentGameBoard[row][col]=value
-        #return a new board of the same size with the value added
-        return SudokuBoard(self.BoardSize, self.CurrentGameBoard, self.ForwardingCheckingBoard)
+        self._place(row, col, value)
+        #the counters live on this object, so hand back the same board
+        return self
+
+    def is_solved(self):
+        """Constant-time check that every cell is filled without conflicts."""
+        return self.EmptyCells == 0 and self.Conflicts == 0
+
+    def is_conflicting(self):
+        """Constant-time check that some unit holds a value twice."""
+        return self.Conflicts > 0
+
+    def trail_mark(self):
+        """Returns a mark for the current end of the undo log."""
+        return len(self.Trail)
+
+    def undo(self, mark):
+        """Rolls back every assignment and domain pruning recorded in the
+        undo log after mark."""
+        trail = self.Trail
+        while len(trail) > mark:
+            kind, row, col, old = trail.pop()
+            if kind == TRAIL_VALUE:
+                self._place(row, col, old)
+            elif kind == TRAIL_REASON:
+                self.Reasons[self.Index[row] + col] = old
+            else:
+                domains = self.ForwardingCheckingBoard[row]
+                if (self.CandidateCounts is not None
+                        and self.Grid[self.Index[row] + col] == 0):
+                    self._candidates(row, col, old & ~domains[col], 1)
+                domains[col] = old
+                if self.Order is not None:
+                    self.Order.update(row, col, old)
                                                                   
                                                                   
+    def board_string(self):
+        """Returns the game board as print_board prints it, as one string.
+        Leaves unassigned spots blank."""
+        div = self.Geometry.SquareSize
+        line = "+" + ("-" * 4 * div + "+") * div
+        sep = "|" + (" " * 4 * div + "|") * div
+        lines = [line]
+        for i in range(self.BoardSize):
+            cells = ["|"]
+            for j in range(self.BoardSize):
+                value = self.Grid[self.Index[i] + j]
+                if value > 9:
+                    cells.append(str(value))
+                elif value > 0:
+                    cells.append(" " + str(value))
+                else:
+                    cells.append("  ")
+                if j+1 == self.BoardSize or (j+1)//div != j//div:
+                    cells.append("|")
+                else:
+                    cells.append("")
+            lines.append(" ".join(cells))
+            if ((i+1)//div != i//div):
+                lines.append(line)
+            else:
+                lines.append(sep)
+        return "\n".join(lines)
+
     def print_board(self):
         """Prints the current game board. Leaves unassigned spots blank."""
-        div = int(math.sqrt(self.BoardSize))
-        dash = ""
-        space = ""
-        line = "+"
-        sep = "|"
-        for i in range(div):
-            dash += "----"
-            space += "    "
-        for i in range(div):
-            line += dash + "+"
-            sep += space + "|"
-        for i in range(-1, self.BoardSize):
-            if i != -1:
-                print "|",
-                for j in range(self.BoardSize):
-                    if self.CurrentGameBoard[i][j] > 9:
-                        print self.CurrentGameBoard[i][j],
-                    elif self.CurrentGameBoard[i][j] > 0:
-                        print "", self.CurrentGameBoard[i][j],
-                    else:
-                        print "  ",
-                    if (j+1 != self.BoardSize):
-                        if ((j+1)//div != j/div):
-                            print "|",
-                        else:
-                            print "",
-                    else:
-                        print "|"
-            if ((i+1)//div != i/div):
-                print line
+        print self.board_string()
+
+class GridRow(object):
+    """One row of a SudokuBoard's flat grid, indexed by col."""
+    __slots__ = ('Grid', 'Start', 'Size')
+
+    def __init__(self, grid, start, size):
+        self.Grid = grid
+        self.Start = start
+        self.Size = size
+
+    def __len__(self):
+        return self.Size
+
+    def __getitem__(self, col):
+        if col < 0:
+            col += self.Size
+        return self.Grid[self.Start + col]
+
+    def __setitem__(self, col, value):
+        if col < 0:
+            col += self.Size
+        self.Grid[self.Start + col] = value
+
+    def __iter__(self):
+        return iter(self.Grid[self.Start:self.Start + self.Size])
+
+
+class VariableOrder:
+    """Buckets of the empty cells keyed by the size of their domain, so the
+    minimum-remaining-values cell is found without scanning the board."""
+
+    def __init__(self, board):
+        size = board.BoardSize
+        self.BoardSize = size
+        self.Buckets = [set() for i in range(size + 1)]
+        #the bucket each cell sits in, -1 for assigned cells
+        self.Remain = [-1] * (size * size)
+        for row in range(size):
+            for col in range(size):
+                if board.Grid[row * size + col] == 0:
+                    self.add(row, col, board.ForwardingCheckingBoard[row][col])
+
+    def add(self, row, col, domain):
+        """Starts tracking an empty cell with the given domain bitmask."""
+        cell = row * self.BoardSize + col
+        remain = popcount(domain)
+        self.Remain[cell] = remain
+        self.Buckets[remain].add(cell)
+
+    def remove(self, row, col):
+        """Stops tracking a cell once it has been assigned."""
+        cell = row * self.BoardSize + col
+        remain = self.Remain[cell]
+        if remain >= 0:
+            self.Buckets[remain].discard(cell)
+            self.Remain[cell] = -1
+
+    def update(self, row, col, domain):
+        """Moves a tracked cell to the bucket of its new domain bitmask."""
+        cell = row * self.BoardSize + col
+        remain = self.Remain[cell]
+        if remain < 0:
+            return
+        new_remain = popcount(domain)
+        if new_remain != remain:
+            self.Buckets[remain].discard(cell)
+            self.Buckets[new_remain].add(cell)
+            self.Remain[cell] = new_remain
+
+    def shrink(self, row, col):
+        """Moves a tracked cell down one bucket after one value was pruned
+        from its domain."""
+        cell = row * self.BoardSize + col
+        remain = self.Remain[cell]
+        if remain > 0:
+            self.Buckets[remain].discard(cell)
+            self.Buckets[remain - 1].add(cell)
+            self.Remain[cell] = remain - 1
+
+    def select(self, board, MCV):
+        """Returns the (row, col) of an empty cell with the fewest values
+        left, breaking ties by the largest degree when MCV is set, or None
+        when every cell is assigned. The ties left are broken at random
+        when the board has a Random, by the lowest cell otherwise."""
+        for bucket in self.Buckets:
+            if bucket:
+                break
+        else:
+            return None
+        if MCV == True and len(bucket) > 1 and board.Random is not None:
+            degrees = [(degree(c // self.BoardSize, c % self.BoardSize,
+                board), c) for c in sorted(bucket)]
+            best = max(degrees)[0]
+            cell = board.Random.choice([c for d, c in degrees if d == best])
+        elif MCV == True and len(bucket) > 1:
+            cell = max(bucket, key=lambda c: (degree(c // self.BoardSize,
+                c % self.BoardSize, board), -c))
+        elif board.Random is not None:
+            cell = board.Random.choice(sorted(bucket))
+        else:
+            cell = min(bucket)
+        return cell // self.BoardSize, cell % self.BoardSize
+
+
+class SearchStats:
+    """Counters and timers of one search, filled in when solve() is called
+    with stats=True. Times are in seconds."""
+
+    def __init__(self):
+        self.nodes = 0              #search nodes expanded
+        self.backtracks = 0         #nodes whose values all failed
+        self.values_tried = 0       #values assigned by the search
+        self.forced = 0             #assignments made by checkingBoard
+        self.backjumps = 0          #levels left without trying their values
+        self.nogoods = 0            #values skipped by a learned nogood
+        self.wipeouts = 0           #empty cells left with no values
+        self.max_depth = 0
+        self.time_is_complete = 0.0
+        self.time_next_empty_position = 0.0
+        self.time_possible_value = 0.0
+        self.time_manipulate_board = 0.0
+        self.time_total = 0.0
+        self.restarts = 0           #runs cut off by solve(restarts=True)
+        self.cached = False         #answered from the solution cache
+        self.stopped = None         #the limit that stopped the search
+        self.solutions = 0          #solutions found with count_solutions
+        self.solved = False
+
+    def as_dict(self):
+        """Returns the record as a plain dict."""
+        return dict(self.__dict__)
+
+    def merge(self, other):
+        """Adds the counters and timers of another search, given as a dict
+        from as_dict, to this one."""
+        for name, value in other.items():
+            if name == 'max_depth':
+                self.max_depth = max(self.max_depth, value)
+            elif name not in ('solved', 'cached', 'stopped', 'solutions',
+                'time_total'):
+                setattr(self, name, getattr(self, name) + value)
+
+
+class CancelToken:
+    """Lets another thread stop a running solve(). The search looks at
+    the token before every node and gives up once it is cancelled."""
+
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class SearchStopped(Exception):
+    """Raised inside the search when a SearchBudget runs out. reason is
+    "timeout", "max_nodes" or "cancelled"."""
+
+    def __init__(self, reason):
+        Exception.__init__(self, reason)
+        self.reason = reason
+
+
+class SearchBudget:
+    """The limits of one search: a deadline, a number of nodes and a
+    CancelToken, any of which may be None."""
+
+    def __init__(self, timeout = None, max_nodes = None, token = None,
+        deadline = None):
+        if timeout is not None:
+            deadline = time.time() + timeout
+        self.deadline = deadline
+        self.max_nodes = max_nodes
+        self.token = token
+        self.nodes = 0
+
+    def check(self):
+        """Raises SearchStopped when the search is cancelled or out of
+        time."""
+        if self.token is not None and self.token.cancelled:
+            raise SearchStopped("cancelled")
+        if self.deadline is not None and time.time() > self.deadline:
+            raise SearchStopped("timeout")
+
+    def spend(self):
+        """Counts one node, raising SearchStopped instead when a limit is
+        reached, so a refused node is not counted. The clock is only read
+        every 8 nodes."""
+        nodes = self.nodes + 1
+        if self.max_nodes is not None and nodes > self.max_nodes:
+            raise SearchStopped("max_nodes")
+        if self.token is not None and self.token.cancelled:
+            raise SearchStopped("cancelled")
+        if (self.deadline is not None and nodes & 7 == 0
+                and time.time() > self.deadline):
+            raise SearchStopped("timeout")
+        self.nodes = nodes
+
+
+class Unsolved:
+    """What solve() returns instead of a board when its timeout, node
+    budget or CancelToken stopped the search. board is the board given to
+    solve(), nodes the nodes searched and elapsed the seconds spent."""
+
+    def __init__(self, reason, board, nodes, elapsed):
+        self.reason = reason
+        self.board = board
+        self.nodes = nodes
+        self.elapsed = elapsed
+
+    def __nonzero__(self):
+        return False
+
+    def __repr__(self):
+        return "Unsolved(%r, nodes=%d, elapsed=%.3f)" % (self.reason,
+            self.nodes, self.elapsed)
+
+
+class Nogoods:
+    """Small sets of (cell, value) decisions found to leave the board
+    without a solution, learned by backjumpSearch and indexed by each of
+    their pairs."""
+
+    def __init__(self, size = NOGOOD_SIZE):
+        self.Size = size
+        self.Watch = {}
+
+    def learn(self, decisions, conflict):
+        """Keeps the decisions at the levels in conflict as a nogood when
+        there are at most Size of them."""
+        if conflict == 0 or popcount(conflict) > self.Size:
+            return
+        nogood = tuple(decisions[level] for level in range(1, len(decisions))
+            if conflict >> level & 1)
+        for pair in nogood:
+            self.Watch.setdefault(pair, []).append(nogood)
+
+    def blocked(self, board, cell, value):
+        """Returns the reasons of the rest of a nogood that assigning value
+        to cell would complete, or None when there is no such nogood."""
+        for nogood in self.Watch.get((cell, value), ()):
+            reason = 0
+            for other, other_value in nogood:
+                if other != cell:
+                    if board.Grid[other] != other_value:
+                        break
+                    reason |= board.Reasons[other]
             else:
-                print sep
+                return reason
+        return None
+
 
 def parse_file(filename):
     """Parses a sudoku text file into a BoardSize, and a 2d array which holds
     the value of each cell. Array elements holding a 0 are considered to be
-    empty."""
-
-    f = open(filename, 'r')
+    empty. filename may also be an open file-like object (such as a zip
+    member) or a buffer holding the text of the file."""
+
+    if hasattr(filename, 'readline'):
+        f = filename
+    elif isinstance(filename, (bytearray, memoryview)):
+        #bytes() of a memoryview is its repr in python 2
+        f = io.BytesIO(filename)
+    elif '\n' in filename:
+        f = io.BytesIO(bytes(filename))
+    else:
+        with open(filename, 'r') as f:
+            return parse_file(f)
     BoardSize = int( f.readline())
     NumVals = int(f.readline())
 
@@ -83,339 +559,1567 @@ def parse_file(filename):
 def is_complete(sudoku_board):
     """Takes in a sudoku board and tests to see if it has been filled in
     correctly."""
-    BoardArray = sudoku_board.CurrentGameBoard
-    size = len(BoardArray)
-    subsquare = int(math.sqrt(size))
-
-    #check each cell on the board for a 0, or if the value of the cell
-    #is present elsewhere within the same row, column, or square
-    for row in range(size):
-        for col in range(size):
-            if BoardArray[row][col]==0:
-                return False
-            for i in range(size):
-                if ((BoardArray[row][i] == BoardArray[row][col]) and i != col):
-                    return False
-                if ((BoardArray[i][col] == BoardArray[row][col]) and i != row):
-                    return False
-            #determine which square the cell is in
-            SquareRow = row // subsquare
-            SquareCol = col // subsquare
-            for i in range(subsquare):
-                for j in range(subsquare):
-                    if((BoardArray[SquareRow*subsquare+i][SquareCol*subsquare+j]
-                            == BoardArray[row][col])
-                        and (SquareRow*subsquare + i != row)
-                        and (SquareCol*subsquare + j != col)):
-                            return False
+    BoardArray = sudoku_board.Grid
+    size = sudoku_board.BoardSize
+
+    #check each row, column and square for a 0, or for a value present
+    #more than once within it
+    for cells in sudoku_board.Geometry.UnitCells:
+        values = set([BoardArray[index] for index, row, col in cells])
+        if 0 in values or len(values) != size:
+            return False
     return True
 
+def sizeGroups(boards):
+  """
+  return the positions of boards in the list grouped by board size
+  """
+  groups = {}
+  for position, board in enumerate(boards):
+    groups.setdefault(board.BoardSize, []).append(position)
+  return groups
+
+def gridArray(boards):
+  """
+  return the grids of boards of one size as a K x N x N numpy array
+  """
+  size = boards[0].BoardSize
+  for board in boards:
+    if board.BoardSize != size:
+      raise ValueError("boards of different sizes: %d and %d"
+          % (size, board.BoardSize))
+  grids = numpy.array([numpy.frombuffer(board.Grid, board.Grid.typecode)
+      for board in boards])
+  return grids.reshape(len(boards), size, size)
+
+def unitArrays(grids):
+  """
+  return the rows, cols and squares of a K x N x N grid array as three
+  K x N x N arrays, where [k, u] holds the cells of unit u of board k
+  """
+  count, size = grids.shape[:2]
+  subsquare = int(math.sqrt(size))
+  squares = grids.reshape(count, subsquare, subsquare, subsquare, subsquare)
+  squares = squares.transpose(0, 1, 3, 2, 4).reshape(count, size, size)
+  return grids, grids.transpose(0, 2, 1), squares
+
+def is_complete_batch(boards):
+  """
+  return is_complete for every board in the list. with numpy the boards of
+  each size are loaded into one K x N x N array, and every row, col and
+  square of all of them is checked to hold 1..N at once.
+  """
+  results = [None] * len(boards)
+  for size, positions in sizeGroups(boards).items():
+    if numpy is None:
+      for position in positions:
+        results[position] = is_complete(boards[position])
+      continue
+    grids = gridArray([boards[position] for position in positions])
+    values = numpy.arange(1, size + 1)
+    complete = numpy.ones(len(positions), dtype=bool)
+    for units in unitArrays(grids):
+      complete &= (numpy.sort(units, axis=2) == values).all(axis=2).all(axis=1)
+    for position, result in zip(positions, complete):
+      results[position] = bool(result)
+  return results
+
 def init_board(file_name):
-    """Creates a SudokuBoard object initialized with values from a text file"""
+    """Creates a SudokuBoard object initialized with values from a text file,
+    a file-like object or a buffer"""
     board = parse_file(file_name)
 
     return SudokuBoard(len(board), board)
 
+#characters of the one-line format, the index of a character is its value
+LINE_DIGITS = ".123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+def parse_line(line):
+    """Parses a puzzle given on one line into a 2d array, like parse_file.
+    The line holds the cells row by row, either as N*N characters with '.'
+    or '0' for an empty cell and 1-9 then A-Z for 10 and up, or as N*N
+    numbers separated by commas or spaces."""
+    line = line.strip()
+    if ',' in line or ' ' in line:
+        values = [int(value) for value in line.replace(',', ' ').split()]
+    else:
+        values = []
+        for char in line.upper():
+            value = 0 if char == '0' else LINE_DIGITS.find(char)
+            if value < 0:
+                raise ValueError("bad cell %r in a one-line puzzle" % char)
+            values.append(value)
+    size = int(round(math.sqrt(len(values))))
+    subsquare = int(round(math.sqrt(size)))
+    if size == 0 or size * size != len(values) or subsquare ** 2 != size:
+        raise ValueError("a one-line puzzle needs N*N cells with N a square, "
+            "got %d cells" % len(values))
+    if max(values) > size or min(values) < 0:
+        raise ValueError("a value of a one-line puzzle is out of range")
+    return [values[row * size:(row + 1) * size] for row in range(size)]
+
+def format_line(board, separator=None):
+    """Returns the board on one line as parse_line reads it: one character
+    per cell up to 35x35, numbers separated by commas beyond that. Given a
+    separator, the cells are always numbers joined by it."""
+    if separator is None and board.BoardSize < len(LINE_DIGITS):
+        return "".join([LINE_DIGITS[value] for value in board.Grid])
+    return (separator or ",").join([str(value) for value in board.Grid])
+
+def format_file(board):
+    """Returns the board in the .sudoku format parse_file reads: the size,
+    the number of given cells and then a tab-separated row, col and value
+    line, counted from 1, for every given cell."""
+    size = board.BoardSize
+    lines = ["%d\t%d\t%d" % (index // size + 1, index % size + 1, value)
+        for index, value in enumerate(board.Grid) if value != 0]
+    return "%d\n%d\n" % (size, len(lines)) + "".join(
+        [line + "\n" for line in lines])
+
+def init_board_line(line):
+    """Creates a SudokuBoard object from a puzzle given on one line"""
+    board = parse_line(line)
+
+    return SudokuBoard(len(board), board)
+
+def zip_members(zip_file):
+    """Returns the names of the .sudoku members of a zip archive, skipping
+    the __MACOSX resource forks."""
+    if not isinstance(zip_file, zipfile.ZipFile):
+        with zipfile.ZipFile(zip_file) as archive:
+            return zip_members(archive)
+    return [name for name in zip_file.namelist()
+        if name.endswith('.sudoku') and not name.startswith('__MACOSX/')
+        and not os.path.basename(name).startswith('._')]
+
+def iter_zip_boards(zip_path):
+    """Yields (member name, SudokuBoard) for every puzzle in a zip archive,
+    reading one member at a time without extracting it."""
+    with zipfile.ZipFile(zip_path) as archive:
+        for name in zip_members(archive):
+            with archive.open(name) as member:
+                yield name, init_board(member)
+
 
 def solve(initial_board, forward_checking = False, MRV = False, MCV = False,
-    LCV = False):
+    LCV = False, trail = True, engine = "backtrack", stats = False,
+    workers = 1, cache = None, backjump = False, timeout = None,
+    max_nodes = None, cancel = None, count_solutions = None,
+    restarts = False, seed = None, verbose = True):
     """Takes an initial SudokuBoard and solves it using back tracking, and zero
     or more of the heuristics and constraint propagation methods (determined by
-    arguments). Returns the resulting board solution. """
+    arguments). Returns the resulting board solution. With trail the search
+    works on one board and undoes failed branches from an undo log instead of
+    copying the board for every value. engine="dlx" solves the board as an
+    exact cover problem with Dancing Links instead, and ignores the other
+    flags. engine="iterative" runs the same search as "backtrack" on an
+    explicit stack instead of recursion, so the depth of the search is not
+    limited by Python's recursion limit; it always uses the trail, and
+    backjump still searches recursively. With stats it returns the board and
+    the SearchStats of the search. workers > 1 splits the top of the search
+    tree into subproblems and searches them on that many processes. cache is a
+    SolutionCache, or True for the module's own one: a board whose canonical
+    form is in the cache is answered from it without searching, and new
+    solutions are added to it. backjump searches with conflict-directed
+    backjumping and nogood learning; it needs forward checking and the trail,
+    and turns them on. timeout (seconds), max_nodes and cancel (a CancelToken)
+    limit the search; when one of them stops it, an Unsolved record is
+    returned in place of the board. count_solutions=k keeps searching after
+    the first solution and returns the number of solutions found, stopping at
+    k, so k=2 tells a unique puzzle (1) from one with several (2); the cache
+    is not used and backjump only turns on forward checking.
+    restarts breaks ties in the order of cells and values at random and starts
+    the search again from the givens whenever a run uses up its nodes, which
+    grow on the Luby sequence; seed makes the random choices repeatable, and
+    on its own breaks the ties at random without restarting. Restarts search
+    in one process and are not used to count solutions. verbose prints the
+    time solve() took."""
 
     start = time.time()
-    if forward_checking == True:
-      initial_board.ForwardingCheckingBoard = initForwardChecking(initial_board)
+    search_stats = SearchStats() if stats == True else None
+    if engine not in ("backtrack", "iterative", "dlx"):
+      raise ValueError("unknown engine: %s" % engine)
+    if cache == True:
+      cache = defaultCache()
+    elif cache == False:
+      cache = None
+    if count_solutions is not None:
+      #a cached solution says nothing about a second one
+      cache = None
+      if count_solutions < 1:
+        raise ValueError("count_solutions must be at least 1")
+    if cache is not None:
+      size = initial_board.BoardSize
+      key, transform = canonicalForm(initial_board)
+      values = cache.lookup(key)
+      if values is not None:
+        if search_stats is not None:
+          search_stats.cached = True
+        return finishSolve(SudokuBoard(size,
+            fromCanonical(values, size, transform)), search_stats, start,
+            verbose)
+    budget = None
+    if timeout is not None or max_nodes is not None or cancel is not None:
+      budget = SearchBudget(timeout, max_nodes, cancel)
+    rng = None
+    if restarts == True or seed is not None:
+      rng = random.Random(seed)
+    try:
+      if engine == "dlx":
+        result_board, result = dancingLinks(initial_board, search_stats,
+            budget, count_solutions)
+      else:
+        result_board, result = searchBoard(initial_board, forward_checking,
+            MRV, MCV, LCV, trail, search_stats, workers, backjump, budget,
+            count_solutions, restarts, rng, engine == "iterative")
+    except SearchStopped as stopped:
+      if search_stats is not None:
+        search_stats.stopped = stopped.reason
+      return finishSolve(Unsolved(stopped.reason, initial_board,
+          budget.nodes, time.time() - start), search_stats, start, verbose)
+    if count_solutions is not None:
+      return finishSolve(result, search_stats, start, verbose)
+    if cache is not None and result == True:
+      cache.add(key, toCanonical(result_board.Grid, size, transform))
+    return finishSolve(result_board, search_stats, start, verbose)
+
+def searchBoard(initial_board, forward_checking, MRV, MCV, LCV, trail,
+    search_stats, workers, backjump = False, budget = None, count = None,
+    restarts = False, rng = None, iterative = False):
+    """Runs the backtracking search of solve() and returns the resulting
+    board and whether it is solved, or with count the number of solutions
+    found, at most count."""
+    if backjump == True:
+      forward_checking = True
+      trail = True
+    if iterative == True:
+      trail = True
+    if restarts == True and count is None:
+      return restartSearch(initial_board, forward_checking, MRV, MCV, LCV,
+          trail, search_stats, backjump, budget, rng, iterative = iterative)
+    board, consistent = prepareBoard(initial_board, forward_checking,
+        MRV, LCV, trail, search_stats, backjump = backjump, budget = budget,
+        rng = rng)
+    result_board = board
+    try:
+      if consistent == False:
+        result = False if count is None else 0
+      elif workers > 1:
+        result_board, result = parallelSearch(board, forward_checking,
+            MRV, MCV, LCV, workers, backjump, count, iterative)
+      elif count is not None and iterative == True:
+        result_board, result = iterativeSearch(board, forward_checking, MRV,
+            MCV, LCV, count)
+      elif count is not None:
+        result = countSolutions(board, forward_checking, MRV, MCV, LCV, count)
+      elif backjump == True:
+        result_board, result, conflict = backjumpSearch(board, MRV, MCV,
+            LCV, Nogoods(), [None])
+      elif iterative == True:
+        result_board, result = iterativeSearch(board, forward_checking, MRV,
+            MCV, LCV)
+      else:
+        result_board, result = backtrack(board, forward_checking ,MRV,  MCV, LCV)
+    finally:
+      for searched in (board, result_board):
+        searched.Stats = None
+        searched.Budget = None
+        searched.Random = None
+    return result_board, result
+
+def luby(i):
+  """
+  return the i-th term, counted from 1, of the Luby sequence
+  1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8, ...
+  """
+  while True:
+    k = 1
+    while (1 << k) - 1 < i:
+      k += 1
+    if i == (1 << k) - 1:
+      return 1 << (k - 1)
+    i -= (1 << (k - 1)) - 1
+
+def restartSearch(initial_board, forward_checking, MRV, MCV, LCV, trail,
+    stats, backjump, budget, rng, unit = RESTART_NODES, iterative = False):
+  """
+  search the board in runs, the i-th cut off after unit * luby(i) nodes,
+  each starting again from the givens with new random tie-breaks from rng. the
+  nogoods learned by backjumping only depend on the givens and are kept from
+  run to run. budget limits all the runs together.
+  returns the resulting board and whether it is solved.
+  """
+  nogoods = Nogoods()
+  run = 0
+  while True:
+    run += 1
+    cutoff = unit * luby(run)
+    limit = cutoff
+    if budget is not None and budget.max_nodes is not None:
+      limit = min(cutoff, budget.max_nodes - budget.nodes)
+    if budget is not None:
+      run_budget = SearchBudget(max_nodes = limit, token = budget.token,
+          deadline = budget.deadline)
     else:
-      initial_board.ForwardingCheckingBoard = []
-    result_board, result = backtrack(initial_board, forward_checking ,MRV,  MCV, LCV)
-    print "Using time: ", time.time() - start
-    return result_board
+      run_budget = SearchBudget(max_nodes = limit)
+    board, consistent = prepareBoard(initial_board, forward_checking, MRV,
+        LCV, trail, stats, backjump = backjump, budget = run_budget,
+        rng = rng)
+    result_board = board
+    try:
+      if consistent == False:
+        return board, False
+      if backjump == True:
+        result_board, result, conflict = backjumpSearch(board, MRV, MCV,
+            LCV, nogoods, [None])
+      elif iterative == True:
+        result_board, result = iterativeSearch(board, forward_checking, MRV,
+            MCV, LCV)
+      else:
+        result_board, result = backtrack(board, forward_checking, MRV, MCV,
+            LCV)
+      return result_board, result
+    except SearchStopped as stopped:
+      if stopped.reason != "max_nodes" or limit < cutoff:
+        #a limit of the whole search, not the end of a run
+        raise
+      if stats is not None:
+        stats.restarts += 1
+    finally:
+      if budget is not None:
+        budget.nodes += min(run_budget.nodes, limit)
+      for searched in (board, result_board):
+        searched.Stats = None
+        searched.Budget = None
+        searched.Random = None
+
+def prepareBoard(initial_board, forward_checking, MRV, LCV, trail, stats,
+    domains = None, backjump = False, budget = None, rng = None):
+  """
+  set up the search state of a board: the undo log, the domain store (built
+  from the grid unless domains are given), the MRV buckets, the stats, the
+  budget, the random tie-breaks and the reasons kept for backjumping, then
+  propagate the givens when forward checking.
+  returns the board to search and False if propagation found it unsolvable.
+  """
+  if trail == True:
+    initial_board = SudokuBoard(initial_board.BoardSize,
+        initial_board.Grid[:], [], [])
+  else:
+    initial_board.Trail = None
+  if domains:
+    initial_board.ForwardingCheckingBoard = domains
+  elif forward_checking == True or MRV == True or LCV == True:
+    #MRV buckets and LCV costs are kept on the domain store even without
+    #forward checking
+    initial_board.ForwardingCheckingBoard = initForwardChecking(initial_board)
+  else:
+    initial_board.ForwardingCheckingBoard = []
+  initial_board.recount()
+  if MRV == True:
+    initial_board.Order = VariableOrder(initial_board)
+  else:
+    initial_board.Order = None
+  initial_board.Stats = stats
+  initial_board.Budget = budget
+  initial_board.Random = rng
+  if backjump == True:
+    initial_board.Reasons = [0] * (initial_board.BoardSize ** 2)
+  else:
+    initial_board.Reasons = None
+  if forward_checking == True:
+    #propagate the givens before the search starts
+    initial_board.Pending = set(range(3 * initial_board.BoardSize))
+    return initial_board, checkingBoard(initial_board)
+  initial_board.Pending = None
+  return initial_board, True
 
+def snapshot(board):
+  """
+  return copies of the grid and the domain store of a board, which is all a
+  subproblem needs to carry to another process
+  """
+  return (board.Grid[:],
+      [list(row) for row in board.ForwardingCheckingBoard])
 
-def backtrack(board, forward_checking ,MRV, MCV, LCV):
-  if is_complete(board) == True:
+def parallelSearch(board, forward_checking, MRV, MCV, LCV, workers,
+    backjump = False, count = None, iterative = False):
+  """
+  expand the top levels of the search tree breadth first until there are a
+  few open subproblems per worker, then search them on a process pool and
+  stop the other workers as soon as one finds a solution.
+  returns the solved board and True, or the board and False. with count
+  the subproblems count their solutions instead, until count are found
+  between them, and the board and that number are returned.
+  """
+  size = board.BoardSize
+  stats = board.Stats
+  budget = board.Budget
+  found = 0
+  frontier = [snapshot(board)]
+  while 0 < len(frontier) < 4 * workers:
+    grid, domains = frontier.pop(0)
+    node, consistent = prepareBoard(SudokuBoard(size, grid), forward_checking,
+        MRV, LCV, True, stats, domains)
+    if consistent == False:
+      continue
+    if node.is_solved():
+      if count is None:
+        return node, True
+      found += 1
+      if found >= count:
+        return board, found
+      continue
+    if budget is not None:
+      budget.spend()
+    if stats is not None:
+      stats.nodes += 1
+    row, col = nextEmptyPosition(node, forward_checking, MRV, MCV)
+    for value in possible_value(row, col, node, forward_checking, LCV):
+      mark = node.trail_mark()
+      node.set_value(row, col, value)
+      if node.ForwardingCheckingBoard:
+        manipulateBoard(node.ForwardingCheckingBoard, row, col, value, node)
+      if forward_checking == False or checkingBoard(node):
+        if node.is_solved() and count is None:
+          return node, True
+        frontier.append(snapshot(node))
+      node.undo(mark)
+  if len(frontier) == 0:
+    return board, False if count is None else found
+
+  #each subproblem only has to find what the frontier left to find
+  wanted = None if count is None else count - found
+  #every worker gets the deadline and a share of what is left of the node
+  #budget, so that together they search no more nodes than it allows
+  jobs = []
+  for i, (open_grid, open_domains) in enumerate(frontier):
+    limits = None
+    if budget is not None:
+      share = None
+      if budget.max_nodes is not None:
+        left = budget.max_nodes - budget.nodes
+        share = left // len(frontier) + (1 if i < left % len(frontier) else 0)
+      limits = (budget.deadline, share)
+    jobs.append((size, open_grid, open_domains, forward_checking, MRV, MCV,
+        LCV, stats is not None, backjump, limits, wanted, iterative))
+  pool = multiprocessing.Pool(workers)
+  stopped = None
+  try:
+    results = pool.imap_unordered(searchSubproblem, jobs)
+    for i in range(len(jobs)):
+      while True:
+        try:
+          answer, worker_stats, reason, nodes = results.next(0.05)
+          break
+        except multiprocessing.TimeoutError:
+          #the token is only seen by this process
+          if budget is not None:
+            budget.check()
+      if budget is not None:
+        budget.nodes += nodes
+      if stats is not None:
+        stats.merge(worker_stats)
+      if count is not None:
+        found += answer
+        if found >= count:
+          return board, count
+      elif answer is not None:
+        return SudokuBoard(size, answer), True
+      stopped = stopped or reason
+  finally:
+    #cancels the workers still searching
+    pool.terminate()
+    pool.join()
+  if stopped is not None:
+    raise SearchStopped(stopped)
+  return board, False if count is None else found
+
+def searchSubproblem(job):
+  """
+  search one subproblem of parallelSearch in a worker process.
+  returns the solved grid or None, or the number of solutions found when
+  the job has a count, the stats of the search as a dict when stats were
+  asked for, the reason the search was stopped or None, and the nodes
+  spent from the job's budget.
+  """
+  (size, grid, domains, forward_checking, MRV, MCV, LCV, collect, backjump,
+      limits, count, iterative) = job
+  stats = SearchStats() if collect else None
+  budget = None
+  if limits is not None:
+    deadline, max_nodes = limits
+    budget = SearchBudget(max_nodes = max_nodes, deadline = deadline)
+  board, consistent = prepareBoard(SudokuBoard(size, grid), forward_checking,
+      MRV, LCV, True, stats, domains, backjump, budget)
+  result = False
+  found = 0
+  reason = None
+  try:
+    if consistent and count is not None and iterative == True:
+      board, found = iterativeSearch(board, forward_checking, MRV, MCV, LCV,
+          count)
+    elif consistent and count is not None:
+      found = countSolutions(board, forward_checking, MRV, MCV, LCV, count)
+    elif consistent and backjump == True:
+      #the assignments above the subproblem count as givens
+      board, result, conflict = backjumpSearch(board, MRV, MCV, LCV,
+          Nogoods(), [None])
+    elif consistent and iterative == True:
+      board, result = iterativeSearch(board, forward_checking, MRV, MCV, LCV)
+    elif consistent:
+      board, result = backtrack(board, forward_checking, MRV, MCV, LCV)
+  except SearchStopped as stopped:
+    reason = stopped.reason
+  if stats is not None:
+    stats = stats.as_dict()
+  nodes = 0 if budget is None else budget.nodes
+  if count is not None:
+    return found, stats, reason, nodes
+  if result == True:
+    return board.Grid, stats, None, nodes
+  return None, stats, reason, nodes
+
+def finishSolve(result_board, stats, start, verbose = True):
+  """
+  report the time of a search when verbose and return what solve() returns:
+  the board, or the board and its stats after checking the board with
+  is_complete.
+  result_board is the number of solutions when they were counted.
+  """
+  if stats is not None and isinstance(result_board, (int, long)):
+    stats.solutions = result_board
+    stats.solved = result_board > 0
+  elif stats is not None:
+    check = time.time()
+    stats.solved = (not isinstance(result_board, Unsolved)
+        and is_complete(result_board))
+    stats.time_is_complete += time.time() - check
+  if stats is not None:
+    stats.time_total = time.time() - start
+  if verbose == True:
+    print "Using time: ", time.time() - start
+  if stats is not None:
+    return result_board, stats
+  return result_board
+
+
+def backtrack(board, forward_checking ,MRV, MCV, LCV, depth = 0):
+  stats = board.Stats
+  if board.Budget is not None:
+    board.Budget.spend()
+  if stats is not None:
+    stats.nodes += 1
+    if depth > stats.max_depth:
+      stats.max_depth = depth
+    start = time.time()
+  finished = board.is_conflicting() or board.is_solved()
+  if stats is not None:
+    stats.time_is_complete += time.time() - start
+  if finished:
+    return board, board.is_solved()
 
-    return board, True
-  #if forward_checking == True:
-    
-    #board.print_board()
+  if stats is not None:
+    start = time.time()
   next_row, next_col = nextEmptyPosition(board, forward_checking, MRV, MCV)
+  if stats is not None:
+    stats.time_next_empty_position += time.time() - start
+    start = time.time()
   value_list = possible_value(next_row, next_col, board, forward_checking ,LCV)
-  print value_list
+  if stats is not None:
+    stats.time_possible_value += time.time() - start
   for value in value_list:
 
-    new_board = deepcopy(board)
+    if board.Trail is not None:
+      #assign in place, the undo log takes the board back on failure
+      mark = board.trail_mark()
+      new_board = board
+    else:
+      #the copy shares the stats, the budget and the random tie-breaks
+      #with the rest of the search
+      new_board = copy.deepcopy(board, {id(stats): stats,
+          id(board.Budget): board.Budget, id(board.Random): board.Random})
     new_board.set_value(next_row, next_col, value)
-    #board1 = copy.deepcopy(new_board)
-    #board2 = copy.copy(new_board)
-    #print "-----------------------"
-    #print "board = ", board
-    #print "new_board = ", new_board
-    #print "board1 = ", board1
-    #print "board2 = ", board2
-    #print "-----------------------"
+    if stats is not None:
+      stats.values_tried += 1
 
+    if new_board.ForwardingCheckingBoard:
+      new_board.ForwardingCheckingBoard = manipulateBoard(new_board.ForwardingCheckingBoard, next_row, next_col, value, new_board)
+    if forward_checking == False or checkingBoard(new_board):
+      temp_board, result = backtrack(new_board, forward_checking, MRV,  MCV, LCV, depth + 1)
+      if result == True:
+        return temp_board, True
+    if board.Trail is not None:
+      board.undo(mark)
 
-    if forward_checking == True:
-      #checkingBoard(board)
-      new_board.ForwardingCheckingBoard = manipulateBoard(new_board.ForwardingCheckingBoard, next_row, next_col, value)
-      checkingBoard(new_board)
-    temp_board, result = backtrack(new_board, forward_checking, MRV,  MCV, LCV)
-    #print "temp_board:", temp_board.print_board
-    if result == True:
-      print "Success!!!"
-      return temp_board, True
-
-  print "fail!!!!!"
+  if stats is not None:
+    stats.backtracks += 1
   return board, False
 
+def iterativeSearch(board, forward_checking, MRV, MCV, LCV, count = None):
+  """
+  the search of backtrack on an explicit stack instead of recursion, so
+  its depth is only limited by memory. every frame holds a cell, an
+  iterator over its values left and the trail mark to undo the last of
+  them from; the board must have a trail. with count it goes on after a
+  solution, like countSolutions.
+  returns the board and whether it is solved, or with count the number of
+  solutions found, at most count.
+  """
+  stats = board.Stats
+  budget = board.Budget
+  stack = []
+  found = 0
+  while True:
+    #a new node, the board as the frames on the stack left it
+    if budget is not None:
+      budget.spend()
+    if stats is not None:
+      stats.nodes += 1
+      if len(stack) > stats.max_depth:
+        stats.max_depth = len(stack)
+    if board.is_solved():
+      if count is None:
+        return board, True
+      found += 1
+      if found >= count:
+        return board, found
+    elif not board.is_conflicting():
+      row, col = nextEmptyPosition(board, forward_checking, MRV, MCV)
+      stack.append((row, col,
+          iter(possible_value(row, col, board, forward_checking, LCV)),
+          board.trail_mark()))
+
+    #the next value of the deepest cell that has one left
+    while stack:
+      row, col, values, mark = stack[-1]
+      board.undo(mark)
+      value = next(values, None)
+      if value is None:
+        stack.pop()
+        if stats is not None:
+          stats.backtracks += 1
+        continue
+      board.set_value(row, col, value)
+      if stats is not None:
+        stats.values_tried += 1
+      if board.ForwardingCheckingBoard:
+        manipulateBoard(board.ForwardingCheckingBoard, row, col, value, board)
+      if forward_checking == False or checkingBoard(board):
+        break
+    else:
+      return board, False if count is None else found
+
+def countSolutions(board, forward_checking, MRV, MCV, LCV, limit, depth = 0):
+  """
+  search the board like backtrack, with the same propagation and
+  heuristics, but go on after a solution until limit solutions are found.
+  the board is left as it was when the search runs on the trail.
+  returns the number of solutions found, at most limit.
+  """
+  stats = board.Stats
+  if board.Budget is not None:
+    board.Budget.spend()
+  if stats is not None:
+    stats.nodes += 1
+    if depth > stats.max_depth:
+      stats.max_depth = depth
+  if board.is_conflicting():
+    return 0
+  if board.is_solved():
+    return 1
+
+  row, col = nextEmptyPosition(board, forward_checking, MRV, MCV)
+  found = 0
+  for value in possible_value(row, col, board, forward_checking, LCV):
+    if board.Trail is not None:
+      mark = board.trail_mark()
+      new_board = board
+    else:
+      new_board = copy.deepcopy(board, {id(stats): stats,
+          id(board.Budget): board.Budget, id(board.Random): board.Random})
+    new_board.set_value(row, col, value)
+    if stats is not None:
+      stats.values_tried += 1
+    if new_board.ForwardingCheckingBoard:
+      new_board.ForwardingCheckingBoard = manipulateBoard(
+          new_board.ForwardingCheckingBoard, row, col, value, new_board)
+    if forward_checking == False or checkingBoard(new_board):
+      found += countSolutions(new_board, forward_checking, MRV, MCV, LCV,
+          limit - found, depth + 1)
+    if board.Trail is not None:
+      board.undo(mark)
+    if found >= limit:
+      return found
+
+  if stats is not None and found == 0:
+    stats.backtracks += 1
+  return found
+
+def backjumpSearch(board, MRV, MCV, LCV, nogoods, decisions, depth = 1):
+  """
+  backtrack with forward checking, jumping straight back over the
+  decisions a failure does not depend on. decisions[level] is the
+  (cell, value) decided at every level above this one, and each level has
+  a bit in the board's Reasons. when all the values of a cell fail, the
+  decisions they failed for are learned on nogoods.
+  returns the board, whether it is solved, and on failure the bitmask of
+  the decision levels the failure depends on.
+  """
+  stats = board.Stats
+  if board.Budget is not None:
+    board.Budget.spend()
+  if stats is not None:
+    stats.nodes += 1
+    if depth > stats.max_depth:
+      stats.max_depth = depth
+  if board.is_solved():
+    return board, True, 0
+
+  row, col = nextEmptyPosition(board, True, MRV, MCV)
+  cell = board.Index[row] + col
+  level = 1 << depth
+  #the values already gone from the cell were pruned for these levels
+  conflict = board.Reasons[cell]
+  for value in possible_value(row, col, board, True, LCV):
+    blocked = nogoods.blocked(board, cell, value)
+    if blocked is not None:
+      if stats is not None:
+        stats.nogoods += 1
+      conflict |= blocked
+      continue
+
+    mark = board.trail_mark()
+    board.set_value(row, col, value)
+    setReason(board, row, col, level)
+    if stats is not None:
+      stats.values_tried += 1
+    manipulateBoard(board.ForwardingCheckingBoard, row, col, value, board)
+    if checkingBoard(board):
+      decisions.append((cell, value))
+      temp_board, result, failure = backjumpSearch(board, MRV, MCV, LCV,
+          nogoods, decisions, depth + 1)
+      decisions.pop()
+      if result == True:
+        return temp_board, True, 0
+    else:
+      failure = board.Failure
+    board.undo(mark)
+    if failure & level == 0:
+      #the failure does not depend on this decision, jump back past it
+      if stats is not None:
+        stats.backjumps += 1
+      return board, False, failure
+    conflict |= failure & ~level
+
+  if stats is not None:
+    stats.backtracks += 1
+  nogoods.learn(decisions, conflict)
+  return board, False, conflict
+
 def nextEmptyPosition(board, forward_checking, MRV, MCV):
-  BoardArray = board.CurrentGameBoard
-  size = len(BoardArray)
-  subsquare = int(math.sqrt(size))
+  BoardArray = board.Grid
+  Index = board.Index
+  size = board.BoardSize
+
+  if MRV == True and board.Order is not None:
+    return board.Order.select(board, MCV)
 
-  min_remain = 10
+  min_remain = size + 1
   prev_min = min_remain
   if(MCV==False and MRV == False):
-    for row in range(size):
-      for col in range(size):
-        if BoardArray[row][col]==0:
-          return row, col
+    #the first empty cell in row-major order
+    return divmod(BoardArray.index(0), size)
 
   elif MRV == True:
     row = 0
     col = 0
     for i in range(size):
       for j in range(size):
-        if BoardArray[i][j] == 0:
+        if BoardArray[Index[i] + j] == 0:
           
-          value_list = possible_value(i, j, board, False, False)
-          if len(value_list) < min_remain:
+          if forward_checking == True:
+            remain = popcount(board.ForwardingCheckingBoard[i][j])
+          else:
+            remain = len(possible_value(i, j, board, False, False))
+          if remain < min_remain:
             row = i
             col = j
             prev_min = min_remain
-            min_remain = len(value_list)
+            min_remain = remain
 
   if prev_min == min_remain:
     if MCV == True:
       row = 0
       col = 0
       maxDegree = -1
+      ties = 0
       for i in range(size):
         for j in range(size):
-          if BoardArray[i][j] == 0:
+          if BoardArray[Index[i] + j] == 0:
             if forward_checking == True:
-              new_degree = board.BoardSize- len(validNumber(board.ForwardingCheckingBoard, i, j))
+              new_degree = board.BoardSize- popcount(board.ForwardingCheckingBoard[i][j])
             else:
               new_degree = degree(i, j, board) 
             if(new_degree > maxDegree):
               row = i
               col = j
               maxDegree = new_degree
+              ties = 1
+            elif new_degree == maxDegree and board.Random is not None:
+              #keep each of the tied cells with the same chance
+              ties += 1
+              if board.Random.randrange(ties) == 0:
+                row = i
+                col = j
 
   return row, col
 
 def degree(row, col, board):
-  BoardArray = board.CurrentGameBoard
-  size = len(BoardArray)
-  subsquare = int(math.sqrt(size))
-
-  count = 0
-  for i in range(size):
-    if (BoardArray[row][i] != 0): 
-      count += 1
-    if (BoardArray[i][col] != 0):
-      count += 1
-
-
-  SquareRow = row // subsquare
-  SquareCol = col // subsquare
-  for i in range(subsquare):
-    for j in range(subsquare):
-      if(BoardArray[SquareRow*subsquare+i][SquareCol*subsquare+j]
-          != 0):
-        count += 1
-
-  return count
+  """
+  return the number of filled cells in the row, col and square of the cell,
+  read from the unit counts the board keeps
+  """
+  counts = board.UnitCounts
+  row_unit, col_unit, square_unit = board.units(row, col)
+  return counts[row_unit][0] + counts[col_unit][0] + counts[square_unit][0]
 
 
 
 def possible_value(row, col, board, forward_checking = False, LCV = False):
-  BoardArray = board.CurrentGameBoard
-  size = len(BoardArray)
-  subsquare = int(math.sqrt(size))
+  BoardArray = board.Grid
+  size = board.BoardSize
 
   result = []
-  constraint = []
 
   if forward_checking == True:
     result = validNumber(board.ForwardingCheckingBoard, row, col)
   else:
-    for i in range(size):
-      constraint.append(i+1)
-
-    temp = copy.deepcopy(constraint)
-    for i in range(size):
-      if BoardArray[row][i] in temp:
-        temp.remove(BoardArray[row][i])
-      if BoardArray[i][col] in temp:
-        temp.remove(BoardArray[i][col])
-
-    SquareRow = row // subsquare
-    SquareCol = col // subsquare
-    for i in range(subsquare):
-      for j in range(subsquare):
-        if(BoardArray[SquareRow*subsquare+i][SquareCol*subsquare+j]
-            in temp):
-          temp.remove(BoardArray[SquareRow*subsquare+i][SquareCol*subsquare+j])
-
-    result = result + temp
+    #the values not used by any peer of the cell
+    used = 0
+    for index, i, j in board.Geometry.Peers[board.Index[row] + col]:
+      if BoardArray[index] != 0:
+        used |= 1 << (BoardArray[index] - 1)
+    result = maskValues(((1 << size) - 1) & ~used)
+  if board.Random is not None:
+    #a random order, which the stable LCV sort keeps among equal costs
+    result = list(result)
+    board.Random.shuffle(result)
   if LCV == True:
-    print "------------"
-    print "before re_order_value", result
-
-    re_order_value(row, col, board, result, forward_checking)
-    print "after re_order_value", result
-    print "------------"
+    result = re_order_value(row, col, board, result, forward_checking)
   #print result
   return result
 
 def re_order_value(row, col, board, l, forward_checking):
-  if len(l) == 0:
-    return []
-  index_list = []
-  result = []
-  BoardArray = board.CurrentGameBoard
-  size = len(BoardArray)
-  subsquare = int(math.sqrt(size))
-  
-  for i in range(len(l)):
-    index_list.append(0)
-
-  for i in range(size):
-    if (BoardArray[row][i] == 0): 
-      c = list(set(l) - (set(l) - set(possible_value(row,i,board, forward_checking,False)))) 
-      for x in c:
-        index_list[l.index(x)] += 1
-    if (BoardArray[i][col] == 0): 
-      c = list(set(l) - (set(l) - set(possible_value(i, col, board, forward_checking,False)))) 
-      for x in c:
-        index_list[l.index(x)] += 1
-
-  SquareRow = row // subsquare
-  SquareCol = col // subsquare
-  for i in range(subsquare):
-    for j in range(subsquare):
-      if(BoardArray[SquareRow*subsquare+i][SquareCol*subsquare+j] == 0):
-        c = list(set(l) - (set(l) - set(possible_value(SquareRow*subsquare+i, SquareCol*subsquare+j, board, forward_checking,False))))
-        for x in c:
-          index_list[l.index(x)] += 1
-
-  sort_list = copy.deepcopy(index_list)
-  sort_list.sort()
-  for i in range(len(sort_list)):
-    temp = l[index_list.index(sort_list[i])]
-    result.append(temp)
-
-  l = result
+  """
+  return the values of l ordered least constraining first. the cost of a
+  value is how many empty cells in the row, col and square of the cell still
+  have it as a candidate, read from the board's CandidateCounts.
+  """
+  if len(l) <= 1 or board.CandidateCounts is None:
+    return list(l)
+  counts = [board.CandidateCounts[unit] for unit in board.units(row, col)]
+
+  return sorted(l, key=lambda value: counts[0][value] + counts[1][value]
+      + counts[2][value])
 
 
 
 #------------------------------------------------------------------
 def checkingBoard(board):
   """
-  Check the ForwardingCheckingBoard to see if there is one cell only contains one possible value, choose it and recursive.
+  Propagate the constraints on the ForwardingCheckingBoard until nothing
+  changes. The units (rows, cols and squares) queued on board.Pending are
+  taken one at a time; each is checked for naked singles, hidden singles
+  and pointing pair / box-line reduction. Every assignment and pruning
+  queues the units it touched, and goes through set_value and eliminate so
+  it lands on the board's Trail.
+  Returns False as soon as an empty cell or a unit runs out of values.
   """
-  BoardSize = board.BoardSize
-  CurrentBoard = board.CurrentGameBoard
-  SquareSize = int(math.sqrt(BoardSize))
-  flag = 0
-
-  for i in range(BoardSize):
-    for j in range(BoardSize):
-      if (board.CurrentGameBoard[i][j] == 0)and(len(board.ForwardingCheckingBoard[i][j]) == 1):
-        board.CurrentGameBoard[i][j] = board.ForwardingCheckingBoard[i][j][0]
-        board.ForwardingCheckingBoard =  manipulateBoard(board.ForwardingCheckingBoard, i, j, board.ForwardingCheckingBoard[i][j][0])
-        flag = 1
+  pending = board.Pending
+  while pending:
+    if not propagateUnit(board, pending.pop()):
+      pending.clear()
+      return False
+  return True
+
+def assignForced(board, row, col, value, reason = None):
+  """
+  assign a value found by propagation and prune it from the peers. reason
+  replaces the decision levels the cell depends on when given.
+  """
+  board.set_value(row, col, value)
+  if reason is not None:
+    setReason(board, row, col, reason)
+  manipulateBoard(board.ForwardingCheckingBoard, row, col, value, board)
+  if board.Stats is not None:
+    board.Stats.forced += 1
+
+def propagateUnit(board, unit):
+  """
+  check one unit of the board. an empty cell with a single value left, or
+  a value with a single place left, is assigned. a value whose places in a
+  square all lie in one row or col is pruned from the rest of that row or
+  col, and a value whose places in a row or col all lie in one square is
+  pruned from the rest of that square.
+  returns False when a cell or a value of the unit has nowhere to go.
+  """
+  size = board.BoardSize
+  geo = board.Geometry
+  subsquare = geo.SquareSize
+  BoardArray = board.Grid
+  domains = board.ForwardingCheckingBoard
+  cells = geo.UnitCells[unit]
+
+  #bits seen once, bits seen more than once, and placed values
+  once = 0
+  more = 0
+  placed = 0
+  for index, row, col in cells:
+    value = BoardArray[index]
+    if value != 0:
+      placed |= 1 << (value - 1)
+      continue
+    domain = domains[row][col]
+    if domain == 0:
+      if board.Reasons is not None:
+        board.Failure = board.Reasons[index]
+      return False
+    if domain & (domain - 1) == 0:
+      #naked single, look at the unit again once it is placed
+      assignForced(board, row, col, domain.bit_length())
+      board.Pending.add(unit)
+      return True
+    more |= once & domain
+    once |= domain
+
+  #what the unit's values and domains depend on
+  reason = unitReason(board, cells)
+  if ((1 << size) - 1) & ~(once | placed):
+    board.Failure = reason
+    return False
+  singles = once & ~more
+  if singles:
+    #hidden single
+    value = (singles & -singles).bit_length()
+    for index, row, col in cells:
+      if BoardArray[index] == 0 and domains[row][col] & singles & -singles:
+        assignForced(board, row, col, value, reason)
         break
-    if flag == 1:
-      break
-  if flag == 1:
-    checkingBoard(board)
+    board.Pending.add(unit)
+    return True
+
+  #group the candidates of the unit by the lines or squares crossing it
+  groups = [0] * subsquare
+  if unit >= 2 * size:
+    first, SquareRow, SquareCol = cells[0]
+    cols = [0] * subsquare
+    for index, row, col in cells:
+      if BoardArray[index] == 0:
+        groups[row - SquareRow] |= domains[row][col]
+        cols[col - SquareCol] |= domains[row][col]
   else:
+    for cell, row, col in cells:
+      if BoardArray[cell] == 0:
+        index = (col if unit < size else row) // subsquare
+        groups[index] |= domains[row][col]
+
+  for index in range(subsquare):
+    others = 0
+    for other in range(subsquare):
+      if other != index:
+        others |= groups[other]
+    confined = groups[index] & ~others
+    if not confined:
+      continue
+    if unit >= 2 * size:
+      #pointing: the values only sit in one row of the square
+      targets = [cell for cell in geo.UnitCells[SquareRow + index]
+          if cell[2] // subsquare != SquareCol // subsquare]
+    elif unit < size:
+      #box-line: the values of the row only sit in one square
+      targets = [cell for cell in geo.UnitCells[2 * size
+          + (unit // subsquare) * subsquare + index] if cell[1] != unit]
+    else:
+      #box-line: the values of the col only sit in one square
+      targets = [cell for cell in geo.UnitCells[2 * size
+          + index * subsquare + (unit - size) // subsquare]
+          if cell[2] != unit - size]
+    prune(board, targets, confined, reason)
+
+  if unit >= 2 * size:
+    for index in range(subsquare):
+      others = 0
+      for other in range(subsquare):
+        if other != index:
+          others |= cols[other]
+      confined = cols[index] & ~others
+      if confined:
+        #pointing: the values only sit in one col of the square
+        prune(board, [cell for cell in geo.UnitCells[size + SquareCol + index]
+            if cell[1] // subsquare != SquareRow // subsquare], confined,
+            reason)
+  return True
+
+def prune(board, cells, mask, reason = 0):
+  """
+  eliminate the values of mask from the empty cells given, as (index, row,
+  col) tuples, for the decision levels in reason
+  """
+  BoardArray = board.Grid
+  domains = board.ForwardingCheckingBoard
+  for index, row, col in cells:
+    if BoardArray[index] == 0 and domains[row][col] & mask:
+      for value in maskValues(domains[row][col] & mask):
+        eliminate(board, row, col, value, reason)
+
+def unitReason(board, cells):
+  """
+  return the decision levels the values and domains of the cells depend
+  on, 0 when the board keeps no reasons
+  """
+  if board.Reasons is None:
+    return 0
+  reasons = board.Reasons
+  reason = 0
+  for index, row, col in cells:
+    reason |= reasons[index]
+  return reason
+
+def setReason(board, row, col, reason):
+  """
+  record on the trail that the cell now depends on the decision levels in
+  reason
+  """
+  if board.Reasons is None:
     return
+  index = board.Index[row] + col
+  if board.Reasons[index] != reason:
+    board.Trail.append((TRAIL_REASON, row, col, board.Reasons[index]))
+    board.Reasons[index] = reason
 
 
 def initForwardChecking(board):
-    """Takes an SudokuBoard, and initiate an 3-dimentioan Bool array. 
-    The size of the Array is BoardSize*BoardSize*BoardSize"""
+    """Takes an SudokuBoard, and initiate an 2-dimentional array of domain
+    bitmasks. Bit (v-1) of a cell's mask is set when value v is still a
+    candidate for that cell."""
 
     BoardSize = board.BoardSize
-    CurrentBoard = board.CurrentGameBoard
-    SquareSize = int(math.sqrt(BoardSize))
-
-    #initiate an 3-dimentioan Bool array.  
-    forward_checking_board =[[ [i+1 for i in range(BoardSize)] for j in range(BoardSize) ] for k in range(BoardSize)]
-    
-    for i in range(BoardSize):
-      for j in range(BoardSize):
-        if board.CurrentGameBoard[i][j] != 0:
-          #mark the corresponding row&col
-          for k in range(BoardSize):
-            if forward_checking_board[i][k].count(board.CurrentGameBoard[i][j]) == 1:
-              forward_checking_board[i][k].remove(board.CurrentGameBoard[i][j])
-
-
-            if forward_checking_board[k][j].count(board.CurrentGameBoard[i][j]) == 1:
-              forward_checking_board[k][j].remove(board.CurrentGameBoard[i][j])  
-                    
-          no_of_square_row = i // SquareSize
-          no_of_square_col = j // SquareSize
-
-          #mark the correspongding square
-          for m in range(no_of_square_row*SquareSize, (no_of_square_row+1)*SquareSize):
-            for n in range(no_of_square_col*SquareSize, (no_of_square_col+1)*SquareSize):
-              if forward_checking_board[m][n].count(board.CurrentGameBoard[i][j]) == 1:
-                forward_checking_board[m][n].remove(board.CurrentGameBoard[i][j])
+    CurrentBoard = board.Grid
+    Units = board.Geometry.Units
+    full = (1 << BoardSize) - 1
+
+    #collect the values already used in every row, col and square
+    used = [0] * (3 * BoardSize)
+    for index in range(BoardSize * BoardSize):
+      if CurrentBoard[index] != 0:
+        bit = 1 << (CurrentBoard[index] - 1)
+        for unit in Units[index]:
+          used[unit] |= bit
+
+    #initiate an 2-dimentional bitmask array.
+    forward_checking_board = [[ full & ~(used[row_unit] | used[col_unit]
+        | used[square_unit])
+        for row_unit, col_unit, square_unit in Units[start:start + BoardSize] ]
+        for start in board.Index]
 
     return forward_checking_board
 
+def initForwardCheckingBatch(boards):
+  """
+  return initForwardChecking for every board in the list. with numpy the
+  boards of each size are loaded into one K x N x N array and the masks of
+  all of them are computed at once. boards bigger than 62x62 do not fit
+  the 64 bit masks and are done one at a time.
+  """
+  results = [None] * len(boards)
+  for size, positions in sizeGroups(boards).items():
+    if numpy is None or size > 62:
+      for position in positions:
+        results[position] = initForwardChecking(boards[position])
+      continue
+    grids = gridArray([boards[position] for position in positions])
+    #bit (v-1) for a value v, nothing for an empty cell
+    bits = (numpy.int64(1) << grids.astype(numpy.int64)) >> 1
+    used = [numpy.bitwise_or.reduce(units, axis=2)
+        for units in unitArrays(bits)]
+    square_of = numpy.array([units[2] - 2 * size
+        for units in geometry(size).Units]).reshape(size, size)
+    masks = ((1 << size) - 1) & ~(used[0][:, :, None] | used[1][:, None, :]
+        | used[2][:, square_of])
+    for position, domains in zip(positions, masks.tolist()):
+      results[position] = domains
+  return results
+
+def popcount(mask):
+  """
+  return the number of values left in the domain bitmask
+  """
+  return bin(mask).count('1')
+
+def maskValues(mask):
+  """
+  return the values in the domain bitmask, smallest first
+  """
+  values = []
+  while mask:
+    low = mask & -mask
+    values.append(low.bit_length())
+    mask ^= low
+  return values
+
 def validNumber(forward_checking_board, row, col):
   """
-  return a list of numbers that can be used to assign to board.CurrentGameBoard[row][col] 
+  return a list of numbers that can be used to assign to the cell (row, col)
   """
-  numbers = forward_checking_board[row][col]
+  numbers = maskValues(forward_checking_board[row][col])
 
   return numbers
 
-def manipulateBoard(forward_checking_board, row, col, value):
+def manipulateBoard(forward_checking_board, row, col, value, board = None):
   """
-  if mode == False: mark the forward_checking_board, assign false to the same row, col, and square. 
+  clear the bit of value from the domains in the same row, col, and square. 
   the same value cannot be used there.
+  when the board owning the domains is given, each change goes through
+  eliminate so the board's bookkeeping follows it.
+  """
+  stats = None
+  if board is not None:
+    stats = board.Stats
+    if stats is not None:
+      start = time.time()
+  if board is not None:
+    geo = board.Geometry
+  else:
+    geo = geometry(len(forward_checking_board))
+  bit = 1 << (value - 1)
+
+  #the cell itself, then its peers
+  cell = geo.Index[row] + col
+  cells = ((cell, row, col),) + geo.Peers[cell]
+
+  #the value of the cell is what its peers lose it for
+  reason = 0
+  if board is not None and board.Reasons is not None:
+    reason = board.Reasons[cell]
+
+  for index, m, n in cells:
+    if forward_checking_board[m][n] & bit:
+      if board is None:
+        forward_checking_board[m][n] ^= bit
+      else:
+        eliminate(board, m, n, value, reason)
+
+  if stats is not None:
+    stats.time_manipulate_board += time.time() - start
+  return forward_checking_board
 
-  if mode == True: mark the forward_checking_board, assign True to the same row, col, and square. 
-  the same value can be used there. 
-  ATTENTION: but need to mark forward_checking_board[row][col][value-1] = False
+def eliminate(board, row, col, value, reason = 0):
   """
-  BoardSize = len(forward_checking_board)
-  SquareSize = int(math.sqrt(BoardSize))
+  clear the bit of value from the domain of one cell of the board. the old
+  domain is recorded on the Trail, the cell moves down its Order bucket,
+  leaves the CandidateCounts of value, and its units are queued on Pending
+  for checkingBoard. when backjumping, the decision levels in reason are
+  added to the reasons of the empty cell.
+  """
+  domains = board.ForwardingCheckingBoard[row]
+  if board.Trail is not None:
+    board.Trail.append((TRAIL_DOMAIN, row, col, domains[col]))
+  domains[col] &= ~(1 << (value - 1))
+  if board.Order is not None:
+    board.Order.shrink(row, col)
+  if board.Grid[board.Index[row] + col] == 0:
+    if board.Reasons is not None:
+      setReason(board, row, col,
+          board.Reasons[board.Index[row] + col] | reason)
+    units = board.units(row, col)
+    if board.CandidateCounts is not None:
+      for unit in units:
+        board.CandidateCounts[unit][value] -= 1
+    if board.Pending is not None:
+      board.Pending.update(units)
+    if board.Stats is not None and domains[col] == 0:
+      board.Stats.wipeouts += 1
 
-  no_of_square_row = row // SquareSize
-  no_of_square_col = col // SquareSize
+#------------------------------------------------------------------
 
-  for i in range(BoardSize):
-    if forward_checking_board[row][i].count(value) == 1:
-      forward_checking_board[row][i].remove(value)
-    if forward_checking_board[i][col].count(value) == 1:
-      forward_checking_board[i][col].remove(value)
+# exact cover engine
 
-  for m in range(no_of_square_row*SquareSize, (no_of_square_row+1)*SquareSize):
-    for n in range(no_of_square_col*SquareSize, (no_of_square_col+1)*SquareSize):
-      if forward_checking_board[m][n].count(value) == 1:
-        forward_checking_board[m][n].remove(value)
+def exactCoverMatrix(board):
+  """
+  build the Dancing Links matrix of the board. node 0 is the root, nodes
+  1..4*N*N are the column headers for the cell, row-value, col-value and
+  square-value constraints, and every candidate (row, col, value) adds a
+  row of four nodes. given cells only get their own value, empty cells the
+  values not already used in their row, col and square.
+  returns the node arrays L, R, U, D, C, the column sizes S and the
+  candidate of every node.
+  """
+  size = board.BoardSize
+  cells = size * size
+  columns = 4 * cells
+  BoardArray = board.Grid
+  Units = board.Geometry.Units
+
+  L = [i - 1 for i in range(columns + 1)]
+  R = [i + 1 for i in range(columns + 1)]
+  L[0] = columns
+  R[columns] = 0
+  U = list(range(columns + 1))
+  D = list(range(columns + 1))
+  C = list(range(columns + 1))
+  S = [0] * (columns + 1)
+  candidate = [None] * (columns + 1)
+
+  used = initForwardChecking(board)
+  node = columns + 1
+  for row in range(size):
+    for col in range(size):
+      cell = row * size + col
+      square = Units[cell][2] - 2 * size
+      if BoardArray[cell] != 0:
+        values = [BoardArray[cell]]
+      else:
+        values = maskValues(used[row][col])
+      #the row-value, col-value and square-value columns of value 1, less 1
+      bases = (cells + row * size, 2 * cells + col * size,
+          3 * cells + square * size)
+      for value in values:
+        first = node
+        triple = (row, col, value)
+        for column in (1 + cell, bases[0] + value, bases[1] + value,
+            bases[2] + value):
+          C.append(column)
+          candidate.append(triple)
+          #link at the bottom of the column
+          U.append(U[column])
+          D.append(column)
+          D[U[column]] = node
+          U[column] = node
+          S[column] += 1
+          #link at the end of the matrix row
+          L.append(node - 1)
+          R.append(node + 1)
+          node += 1
+        L[first] = node - 1
+        R[node - 1] = first
+
+  return L, R, U, D, C, S, candidate
+
+def dancingLinks(board, stats = None, budget = None, count = None):
+  """
+  solve the board as an exact cover problem with Knuth's Algorithm X on
+  Dancing Links, always branching on the column with the fewest rows.
+  the search runs on an explicit stack of chosen nodes, and counts its
+  nodes, rows tried and backtracks on stats when given, and spends one
+  node of the budget for every column it branches on.
+  returns a new solved SudokuBoard and True, or the board and False. with
+  count it backtracks out of every solution until count are found, and
+  returns the board and the number found.
+  """
+  L, R, U, D, C, S, candidate = exactCoverMatrix(board)
+
+  def cover(c):
+    L[R[c]] = L[c]
+    R[L[c]] = R[c]
+    i = D[c]
+    while i != c:
+      j = R[i]
+      while j != i:
+        U[D[j]] = U[j]
+        D[U[j]] = D[j]
+        S[C[j]] -= 1
+        j = R[j]
+      i = D[i]
+
+  def uncover(c):
+    i = U[c]
+    while i != c:
+      j = L[i]
+      while j != i:
+        S[C[j]] += 1
+        U[D[j]] = j
+        D[U[j]] = j
+        j = L[j]
+      i = U[i]
+    L[R[c]] = c
+    R[L[c]] = c
+
+  stack = []
+  found = 0
+  forward = True
+  while True:
+    if forward and R[0] == 0:
+      if count is None:
+        break
+      found += 1
+      if found >= count:
+        return board, found
+      forward = False
+    if forward:
+      #choose the column with the fewest rows
+      c = R[0]
+      best = S[c]
+      j = R[c]
+      while j != 0 and best > 1:
+        if S[j] < best:
+          c = j
+          best = S[j]
+        j = R[j]
+      cover(c)
+      r = D[c]
+      if budget is not None:
+        budget.spend()
+      if stats is not None:
+        stats.nodes += 1
+        stats.max_depth = max(stats.max_depth, len(stack))
+    else:
+      if len(stack) == 0:
+        return board, False if count is None else found
+      r = stack.pop()
+      c = C[r]
+      j = L[r]
+      while j != r:
+        uncover(C[j])
+        j = L[j]
+      r = D[r]
+
+    if r == c:
+      #every row of the column failed
+      uncover(c)
+      forward = False
+      if stats is not None:
+        stats.backtracks += 1
+      continue
+    stack.append(r)
+    if stats is not None:
+      stats.values_tried += 1
+    j = R[r]
+    while j != r:
+      cover(C[j])
+      j = R[j]
+    forward = True
+
+  solution = board.Grid[:]
+  for r in stack:
+    row, col, value = candidate[r]
+    solution[row * board.BoardSize + col] = value
+  return SudokuBoard(board.BoardSize, solution), True
 
-  return forward_checking_board
+#------------------------------------------------------------------
+
+# solution cache
+
+#most tie orders tried per board when looking for its canonical form
+CANONICAL_LIMIT = 64
+
+def tieOrders(lines, key, limit):
+  """
+  return the orders of lines sorted by key, taking tied lines in every
+  order, or only the sorted order when that gives more than limit orders
+  """
+  lines = sorted(lines, key=key)
+  groups = [tuple(group) for k, group in itertools.groupby(lines, key)]
+  count = 1
+  for group in groups:
+    count *= math.factorial(len(group))
+  if count > limit:
+    return [tuple(lines)]
+  return [sum(choice, ()) for choice in
+      itertools.product(*[list(itertools.permutations(group))
+      for group in groups])]
+
+def blockOrders(blocks, key, limit):
+  """
+  return the orders of the lines of blocks (the bands or the stacks) with
+  the blocks sorted by the keys of their lines and the lines of each block
+  by key. ties are tried in every order, up to limit orders in all.
+  """
+  inner = [tieOrders(block, key, limit) for block in blocks]
+  outer = tieOrders(range(len(blocks)),
+      lambda block: sorted(key(line) for line in blocks[block]), limit)
+  count = len(outer)
+  for orders in inner:
+    count *= len(orders)
+  if count > limit:
+    inner = [orders[:1] for orders in inner]
+    outer = outer[:1]
+  return [sum(choice, ()) for order in outer
+      for choice in itertools.product(*[inner[block] for block in order])]
+
+def lineOrders(grid, size, subsquare, limit):
+  """
+  return the candidate orders of the rows and of the cols of a flat grid.
+  lines are ranked by keys that survive relabeling the digits and
+  permuting the rows and cols: their clue count, how often their digits
+  are used on the board, and the same for the lines crossing their clues.
+  """
+  frequency = [0] * (size + 1)
+  for value in grid:
+    frequency[value] += 1
+  rows = [[(col, grid[row * size + col]) for col in range(size)
+      if grid[row * size + col] != 0] for row in range(size)]
+  cols = [[(row, grid[row * size + col]) for row in range(size)
+      if grid[row * size + col] != 0] for col in range(size)]
+  row_keys = [(len(clues), sorted(frequency[value] for i, value in clues))
+      for clues in rows]
+  col_keys = [(len(clues), sorted(frequency[value] for i, value in clues))
+      for clues in cols]
+  row_keys, col_keys = (
+      [(row_keys[row], sorted(col_keys[col] for col, value in rows[row]))
+          for row in range(size)],
+      [(col_keys[col], sorted(row_keys[row] for row, value in cols[col]))
+          for col in range(size)])
+  blocks = [range(start, start + subsquare)
+      for start in range(0, size, subsquare)]
+  return (blockOrders(blocks, row_keys.__getitem__, limit),
+      blockOrders(blocks, col_keys.__getitem__, limit))
+
+def relabel(grid, size, rows, cols):
+  """
+  return the grid with its rows and cols taken in the given orders and its
+  digits renumbered by first appearance, and the digit map used
+  """
+  digits = [0] * (size + 1)
+  label = 0
+  values = []
+  for row in rows:
+    start = row * size
+    for col in cols:
+      value = grid[start + col]
+      if value != 0 and digits[value] == 0:
+        label += 1
+        digits[value] = label
+      values.append(digits[value])
+  #digits missing from the grid take the labels left over
+  for value in range(1, size + 1):
+    if digits[value] == 0:
+      label += 1
+      digits[value] = label
+  return values, digits
+
+def canonicalForm(board, limit = CANONICAL_LIMIT):
+  """
+  return the canonical key of a board and the transform taking the board
+  to it. the canonical form is the smallest relabeled grid over the
+  transposition and the candidate row and col orders, so boards that only
+  differ by relabeling the digits, permuting rows or cols within bands or
+  stacks, swapping bands or stacks, or transposing share a key (as long as
+  the ties between their lines fit in limit orders).
+  the transform is (transpose, rows, cols, digits) as used by toCanonical
+  and fromCanonical.
+  """
+  size = board.BoardSize
+  grid = board.Grid
+  best = None
+  for transpose in (False, True):
+    if transpose:
+      grid = [board.Grid[col * size + row]
+          for row in range(size) for col in range(size)]
+    row_orders, col_orders = lineOrders(grid, size,
+        board.Geometry.SquareSize, limit)
+    if len(row_orders) * len(col_orders) > limit:
+      row_orders = row_orders[:1]
+      col_orders = col_orders[:1]
+    for rows in row_orders:
+      for cols in col_orders:
+        values, digits = relabel(grid, size, rows, cols)
+        if best is None or values < best[0]:
+          best = values, (transpose, rows, cols, digits)
+  values, transform = best
+  return "%d:%s" % (size, ",".join(map(str, values))), transform
+
+def toCanonical(grid, size, transform):
+  """
+  return the values of a flat grid moved into the canonical frame
+  """
+  transpose, rows, cols, digits = transform
+  values = []
+  for row in rows:
+    for col in cols:
+      if transpose:
+        values.append(digits[grid[col * size + row]])
+      else:
+        values.append(digits[grid[row * size + col]])
+  return values
+
+def fromCanonical(values, size, transform):
+  """
+  return the flat grid whose canonical frame holds values
+  """
+  transpose, rows, cols, digits = transform
+  inverse = [0] * (size + 1)
+  for value in range(1, size + 1):
+    inverse[digits[value]] = value
+  grid = makeGrid(size, [[0] * size for i in range(size)])
+  i = 0
+  for row in rows:
+    for col in cols:
+      if transpose:
+        grid[col * size + row] = inverse[values[i]]
+      else:
+        grid[row * size + col] = inverse[values[i]]
+      i += 1
+  return grid
+
+class SolutionCache:
+  """Solutions of solved boards in canonical form, keyed by canonicalForm
+  and evicting the least recently used entry past capacity. With a path
+  the entries are loaded from that file, and every new one is appended to
+  it as a JSON line; save() rewrites the file with the live entries."""
+
+  def __init__(self, capacity = 1024, path = None):
+    self.capacity = capacity
+    self.path = path
+    self.entries = collections.OrderedDict()
+    if path is not None and os.path.exists(path):
+      with open(path) as f:
+        for line in f:
+          if line.strip():
+            key, values = json.loads(line)
+            self.store(str(key), values)
+
+  def lookup(self, key):
+    """Returns the canonical solution of key, or None."""
+    values = self.entries.pop(key, None)
+    if values is not None:
+      self.entries[key] = values
+    return values
+
+  def store(self, key, values):
+    """Keeps a canonical solution, evicting the oldest entry when full."""
+    self.entries.pop(key, None)
+    self.entries[key] = values
+    while len(self.entries) > self.capacity:
+      self.entries.popitem(last=False)
+
+  def add(self, key, values):
+    """Stores a new solution, appending it to the file when there is one."""
+    self.store(key, values)
+    if self.path is not None:
+      with open(self.path, "a") as f:
+        f.write(json.dumps([key, values]) + "\n")
+
+  def save(self):
+    """Rewrites the file with the entries still in the cache."""
+    with open(self.path, "w") as f:
+      for key, values in self.entries.items():
+        f.write(json.dumps([key, values]) + "\n")
+
+  def __len__(self):
+    return len(self.entries)
+
+#the cache used by solve(cache=True)
+_default_cache = None
+
+def defaultCache():
+  """
+  return the module's SolutionCache, creating it on first use
+  """
+  global _default_cache
+  if _default_cache is None:
+    _default_cache = SolutionCache()
+  return _default_cache
 
 #------------------------------------------------------------------
 
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+"""Solves puzzles given one per line (see SudokuStarterv2.parse_line) and
+writes one solution per line in the same format, in input order:
+
+  python SudokuStream.py puzzles.txt -o solutions.txt --forward-checking
+  cat puzzles.txt | python SudokuStream.py -j 4 --engine dlx > solutions.txt
+
+Blank lines and lines starting with # are skipped. The puzzles are read,
+solved and written by a chain of generators, so only a bounded number of
+them are in memory at a time whatever the size of the input. A puzzle that
+cannot be read, has no solution or runs out of time gets an empty line, so
+the output lines still match the input puzzles.
+"""
+import argparse, itertools, multiprocessing, sys
+
+import SudokuStarterv2
+
+def read_puzzles(stream):
+  """
+  yield the puzzle lines of stream, skipping blank lines and # comments
+  """
+  for line in stream:
+    line = line.strip()
+    if line and not line.startswith("#"):
+      yield line
+
+def separator(line):
+  """
+  return the separator of the cells on a puzzle line, None for one
+  character per cell
+  """
+  if "," in line:
+    return ","
+  if " " in line:
+    return " "
+  return None
+
+def solve_line(job):
+  """
+  solve the puzzle on one line. job is (line, options), where options is
+  passed on to solve(). returns (solution line, status), the solution line
+  is empty unless status is "solved".
+  """
+  line, options = job
+  try:
+    board = SudokuStarterv2.init_board_line(line)
+  except ValueError as e:
+    sys.stderr.write("bad puzzle: %s\n" % e)
+    return "", "error"
+  result = SudokuStarterv2.solve(board, verbose=False, **options)
+  if isinstance(result, SudokuStarterv2.Unsolved):
+    return "", result.reason
+  if not SudokuStarterv2.is_complete(result):
+    return "", "unsolvable"
+  return SudokuStarterv2.format_line(result, separator(line)), "solved"
+
+def solve_puzzles(lines, options, workers=1, chunk=1024):
+  """
+  yield solve_line of every line, in order. with more than one worker the
+  lines are solved on a pool, chunk lines at a time, since Pool.imap would
+  read all of its input up front.
+  """
+  jobs = ((line, options) for line in lines)
+  if workers <= 1:
+    for job in jobs:
+      yield solve_line(job)
+    return
+  pool = multiprocessing.Pool(workers)
+  try:
+    while True:
+      block = list(itertools.islice(jobs, chunk))
+      if not block:
+        break
+      for result in pool.imap(solve_line, block,
+          max(1, chunk // (4 * workers))):
+        yield result
+    pool.close()
+  except:
+    pool.terminate()
+    raise
+  finally:
+    pool.join()
+
+def write_solutions(results, stream, buffer_lines=1024):
+  """
+  write the solution line of every result to stream, buffer_lines lines
+  at a time. returns the number of results with each status.
+  """
+  counts = {}
+  buffer = []
+  for solution, status in results:
+    buffer.append(solution)
+    counts[status] = counts.get(status, 0) + 1
+    if len(buffer) >= buffer_lines:
+      stream.write("\n".join(buffer) + "\n")
+      del buffer[:]
+  if buffer:
+    stream.write("\n".join(buffer) + "\n")
+  stream.flush()
+  return counts
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Solve one-line puzzles from "
+      "a file or stdin and write one solution per line.")
+  parser.add_argument("input", nargs="?", default="-",
+      help="the puzzle file, stdin by default or with -")
+  parser.add_argument("-o", "--output",
+      help="write solutions to this file instead of stdout")
+  parser.add_argument("-j", "--workers", type=int, default=1,
+      help="number of worker processes")
+  parser.add_argument("--chunk", type=int, default=1024,
+      help="puzzles read ahead for the workers and written at once")
+  parser.add_argument("--engine", choices=["backtrack", "iterative", "dlx"],
+      default="backtrack")
+  parser.add_argument("--forward-checking", action="store_true")
+  parser.add_argument("--mrv", action="store_true")
+  parser.add_argument("--mcv", action="store_true")
+  parser.add_argument("--lcv", action="store_true")
+  parser.add_argument("--timeout", type=float,
+      help="seconds before a puzzle is given up")
+  parser.add_argument("--max-nodes", type=int,
+      help="search nodes before a puzzle is given up")
+  parser.add_argument("--restarts", action="store_true",
+      help="restart the search with random tie-breaks on a Luby schedule")
+  parser.add_argument("--seed", type=int,
+      help="seed of the random tie-breaks")
+  args = parser.parse_args(argv)
+
+  options = {"engine": args.engine, "forward_checking": args.forward_checking,
+      "MRV": args.mrv, "MCV": args.mcv, "LCV": args.lcv,
+      "timeout": args.timeout, "max_nodes": args.max_nodes,
+      "restarts": args.restarts, "seed": args.seed}
+  source = sys.stdin if args.input == "-" else open(args.input)
+  stream = open(args.output, "w") if args.output else sys.stdout
+  try:
+    results = solve_puzzles(read_puzzles(source), options, args.workers,
+        args.chunk)
+    counts = write_solutions(results, stream, args.chunk)
+  finally:
+    if args.output:
+      stream.close()
+    if source is not sys.stdin:
+      source.close()
+  total = sum(counts.values())
+  solved = counts.pop("solved", 0)
+  sys.stderr.write("solved %d of %d puzzles%s\n" % (solved, total, "".join(
+      ", %d %s" % (counts[status], status) for status in sorted(counts))))
+  return 0 if solved == total else 1
+
+if __name__ == "__main__":
+  sys.exit(main())